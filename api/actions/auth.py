@@ -3,19 +3,31 @@ from datetime import datetime, timedelta
 from uuid import UUID
 
 from fastapi import Depends
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.dals import UserDAL, TokenDAL
 from hashing import Hasher
 from db.models import User
 from typing import Union
 from fastapi.security import OAuth2PasswordBearer
-from db.session import get_db
+from db.session import get_read_db
+import metrics
 import settings
+from cache import LRUCache
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
 
+# str(user_id) -> User, detached from its session; only read by the handlers
+user_cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+metrics.REGISTRY.register_cache("user", user_cache)
+
+
+def invalidate_cached_user(user_id):
+    """Must be called after every change of a user row"""
+    user_cache.pop(str(user_id))
+
 
 async def _get_user_by_email_for_auth(email: str, session: AsyncSession) -> Union[User, None]:
     async with session.begin():
@@ -33,8 +45,13 @@ async def authentikate_user(email: str, password: str, session: AsyncSession) ->
     user = await _get_user_by_email_for_auth(email, session)
     if not user:
         return
-    if not Hasher.verify_password(password, user.hashed_password):
+    is_valid, new_hash = await Hasher.async_verify_and_update(password, user.hashed_password)
+    if not is_valid:
         return
+    if new_hash:
+        async with session.begin():
+            user = await UserDAL(session).update_user(user.user_id, hashed_password=new_hash)
+        invalidate_cached_user(user.user_id)
     return user
 
 
@@ -43,9 +60,13 @@ async def save_refresh_token_to_db(user_id: UUID,
                                    token_expires: timedelta,
                                    ip_address: str,
                                    session: AsyncSession):
-    async with session.begin():
-        token_dal = TokenDAL(session)
-        await token_dal.save_token(user_id, token, token_expires, ip_address)
+    try:
+        async with session.begin():
+            token_dal = TokenDAL(session)
+            await token_dal.save_token(user_id, token, token_expires, ip_address)
+    except IntegrityError as err:
+        # the transaction is rolled back, the client must not get a refresh token that was not saved
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
 
 
 async def get_user_by_refresh_token(token: str, session: AsyncSession):
@@ -65,9 +86,8 @@ async def get_user_by_refresh_token(token: str, session: AsyncSession):
         return user
 
 
-async def get_current_user_from_token(
-        token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_db)
-):
+def _decode_access_token(token: str) -> str:
+    """The user id ("sub") of a valid unexpired access token, 401 otherwise"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -80,9 +100,33 @@ async def get_current_user_from_token(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return user_id
 
-    user = await _get_user_by_id(user_id=user_id, session=session)
-    if not user:
+
+async def get_user_id_from_token(token: str = Depends(oauth2_scheme)) -> str:
+    """Checks only the jwt, for endpoints that must not touch the database.
+
+    A deactivated user keeps access to them until the access token expires.
+    """
+    return _decode_access_token(token)
+
+
+async def get_current_user_from_token(
+        token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_read_db)
+):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+    )
+    user_id = _decode_access_token(token)
+
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await _get_user_by_id(user_id=user_id, session=session)
+        if not user:
+            raise credentials_exception
+        user_cache.set(user_id, user)
+    if not user.is_active:
         raise credentials_exception
     return user
 
@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+from uuid import UUID
+
+import settings
+from db.dals import WordDAL
+from db.session import read_session, ATOMIC
+
+EXPORT_COLUMNS = ("word", "translation", "part_of_speech", "is_favorite", "translation_status", "added_at")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _values(row) -> tuple:
+    *values, added_at = row
+    return (*values, added_at.isoformat() if added_at is not None else "")
+
+
+def _encode_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, _values(row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _encode_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_export(user_id: UUID, export_format: str) -> AsyncIterator[bytes]:
+    """Body of /user/my-words/export, one chunk per cursor fetch.
+
+    The session lives in the generator rather than in a dependency: the
+    response is streamed after the handler returns and must keep its
+    connection until the last row is sent.
+    """
+    if export_format == "csv":
+        yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    encode = _encode_csv if export_format == "csv" else _encode_ndjson
+
+    async with read_session() as session:
+        async with session.begin():
+            await session.connection(execution_options=ATOMIC)
+            async for rows in WordDAL(session).stream_user_words(user_id, settings.EXPORT_FETCH_SIZE):
+                yield encode(rows).encode()
@@ -0,0 +1,39 @@
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Union
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(sort_value: Union[datetime, str], bundle_id) -> str:
+    """Opaque keyset cursor pointing at the last row of a page"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, str(bundle_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        sort_value, bundle_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "time":
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, uuid.UUID(bundle_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def naive_utc(value: Union[datetime, None]) -> Union[datetime, None]:
+    """added_at is stored as naive utc, aware datetimes from the query are converted to it"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def vocabulary_etag(user_id, version: int, query: str) -> str:
+    """ETag of a /user/my-words response: changes with the vocabulary version and the query"""
+    digest = hashlib.sha1(f"{user_id}:{query}".encode()).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
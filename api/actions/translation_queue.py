@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Set, Tuple, Union
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+import settings
+from api.actions.translator import TranslatorUnavailable
+from api.actions.word import WordService
+from db.dals import WordDAL
+from db.session import async_session, ATOMIC
+
+# (bundle_id, user_id, word_id, word)
+PendingBundle = Tuple[UUID, UUID, UUID, str]
+
+
+class TranslationQueue:
+    """Bounded queue of pending bundles translated by a fixed number of worker tasks.
+
+    A failed translation is retried with exponential backoff, after `retries`
+    attempts the bundle is marked "failed" so the client can offer a manual one.
+
+    Every process runs its own queue, so a bundle is claimed (user_words.claimed_until)
+    before it is queued: the claim keeps other processes off it for `lease` seconds.
+    A bundle that does not fit is released, and a bundle whose process died is
+    claimed again once its lease runs out; both are picked up by the requeue that
+    runs every `requeue_interval` seconds.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = settings.TRANSLATION_QUEUE_SIZE,
+            workers: int = settings.TRANSLATION_QUEUE_WORKERS,
+            retries: int = settings.TRANSLATION_QUEUE_RETRIES,
+            backoff: float = settings.TRANSLATION_QUEUE_BACKOFF,
+            lease: int = settings.TRANSLATION_QUEUE_LEASE,
+            requeue_interval: float = settings.TRANSLATION_QUEUE_REQUEUE_INTERVAL,
+    ):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.lease = lease
+        self.requeue_interval = requeue_interval
+        self._queue: Union[asyncio.Queue, None] = None
+        self._tasks: List[asyncio.Task] = []
+        self._waiting: Set[asyncio.Task] = set()
+
+    def full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def claimed_until(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.lease)
+
+    def enqueue(self, bundle: PendingBundle) -> bool:
+        """False when the queue is not running or full, the caller then releases its claim on the bundle"""
+        if self.full():
+            return False
+        self._queue.put_nowait((bundle, 0))
+        metrics.translation_queue_size.set(self._queue.qsize())
+        return True
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._requeue_periodically()))
+
+    async def stop(self):
+        tasks = self._tasks + list(self._waiting)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        queued = []
+        while self._queue is not None and not self._queue.empty():
+            (bundle_id, *_), _ = self._queue.get_nowait()
+            queued.append(bundle_id)
+        self._tasks = []
+        self._waiting.clear()
+        self._queue = None
+        if queued:
+            # bundles waiting in the retry backoff keep their lease until it runs out
+            try:
+                await self.release(queued)
+            except Exception as error:
+                print("Не удалось освободить отложенные слова:", repr(error))
+
+    async def release(self, bundle_ids: List[UUID]):
+        async with async_session() as session:
+            async with session.begin():
+                await WordDAL(session).release_pending_bundles(bundle_ids)
+
+    async def requeue_pending(self) -> int:
+        """Claims as many pending bundles as the queue has room for: left by a restart, a full queue or another process"""
+        if self._queue is None:
+            return 0
+        free = self.maxsize - self._queue.qsize()
+        if free <= 0:
+            return 0
+        now = datetime.utcnow()
+        async with async_session() as session:
+            async with session.begin():
+                pending = await WordDAL(session).claim_pending_bundles(free, now, self.claimed_until(now))
+        overflow = [bundle[0] for bundle in pending if not self.enqueue(bundle)]
+        if overflow:
+            await self.release(overflow)
+        return len(pending) - len(overflow)
+
+    async def _requeue_periodically(self):
+        while True:
+            try:
+                await self.requeue_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print("Ошибка при перезапуске отложенных слов:", repr(error))
+            await asyncio.sleep(self.requeue_interval)
+
+    async def _worker(self):
+        while True:
+            bundle, attempt = await self._queue.get()
+            metrics.translation_queue_size.set(self._queue.qsize())
+            try:
+                await self._process(bundle, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                metrics.translation_queue_processed.inc(result="error")
+                print("Ошибка при переводе отложенного слова:", repr(error))
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, bundle: PendingBundle, attempt: int):
+        bundle_id, user_id, word_id, word = bundle
+        try:
+            async with async_session() as session:
+                translation, pos = await WordService.lookup_translation(word, WordDAL(session))
+        except TranslatorUnavailable:
+            if attempt < self.retries:
+                metrics.translation_queue_processed.inc(result="retry")
+                task = asyncio.create_task(self._retry_later(bundle, attempt + 1))
+                self._waiting.add(task)
+                task.add_done_callback(self._waiting.discard)
+                return
+            translation = pos = None
+
+        async with async_session() as session:
+            word_dal = WordDAL(session)
+            if not translation:
+                async with session.begin():
+                    await session.connection(execution_options=ATOMIC)
+                    await word_dal.mark_translation_failed(bundle_id, user_id)
+                metrics.translation_queue_processed.inc(result="failed")
+                return
+            try:
+                async with session.begin():
+                    await session.connection(execution_options=ATOMIC)
+                    await word_dal.fill_pending_translation(bundle_id, user_id, word_id, translation, pos)
+            except IntegrityError:
+                # the user already has this word with this translation, the pending bundle is a duplicate
+                async with session.begin():
+                    await session.connection(execution_options=ATOMIC)
+                    await word_dal.delete_bundle_by_id(user_id, bundle_id)
+        metrics.translation_queue_processed.inc(result="translated")
+
+    async def _retry_later(self, bundle: PendingBundle, attempt: int):
+        await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+        if self._queue is not None and not self._queue.full():
+            self._queue.put_nowait((bundle, attempt))
+            metrics.translation_queue_size.set(self._queue.qsize())
+            return
+        # no room: another requeue picks the bundle up from the start
+        metrics.translation_queue_processed.inc(result="released")
+        await self.release([bundle[0]])
+
+
+translation_queue = TranslationQueue()
@@ -0,0 +1,258 @@
+import asyncio
+import time
+from typing import Dict, List, Union
+
+import httpx
+
+import metrics
+import settings
+from rate_limit import limiter
+
+
+class TranslatorUnavailable(Exception):
+    """The translator failed or the circuit breaker does not let calls through"""
+
+
+class TranslatorBudgetExceeded(TranslatorUnavailable):
+    """The global budget of upstream translator requests is spent for now"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"translator budget exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TranslatorCircuitOpen(TranslatorUnavailable):
+    """The circuit breaker is open, the next probe call goes through in `retry_after` seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit breaker is open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class _LeaderCancelled(TranslatorUnavailable):
+    """The request that made the upstream call was cancelled, a waiting one takes the call over"""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` failures in a row and fails fast while open.
+
+    After `reset_timeout` seconds one probe call is let through (half-open):
+    its success closes the breaker, its failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe call, at least 1 while a probe is in flight"""
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 1.0)
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def release_probe(self):
+        """The call was cancelled before it could tell anything about the translator"""
+        self._probe_in_flight = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.translator_circuit_open.set(int(state != self.CLOSED))
+
+
+class TranslatorClient:
+    """Async client for the rapid api translator.
+
+    One instance is shared by the whole process, so every call reuses the same
+    keep-alive connection pool instead of opening a new TCP/TLS connection.
+    """
+
+    def __init__(
+            self,
+            url: str = settings.TRANSLATOR_URL,
+            host: str = settings.TRANSLATOR_HOST,
+            api_key: str = settings.TRANSLATOR_API_KEY,
+            timeout: float = settings.TRANSLATOR_TIMEOUT,
+            max_connections: int = settings.TRANSLATOR_MAX_CONNECTIONS,
+            keepalive_connections: int = settings.TRANSLATOR_KEEPALIVE_CONNECTIONS,
+            retries: int = settings.TRANSLATOR_RETRIES,
+            backoff: float = settings.TRANSLATOR_BACKOFF,
+            batch_size: int = settings.TRANSLATOR_BATCH_SIZE,
+            breaker: Union[CircuitBreaker, None] = None,
+    ):
+        self.url = url
+        self.host = host
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.keepalive_connections = keepalive_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.TRANSLATOR_BREAKER_FAILURES,
+            reset_timeout=settings.TRANSLATOR_BREAKER_RESET,
+        )
+        self._client: Union[httpx.AsyncClient, None] = None
+        # text -> result of the upstream call already running for it
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.keepalive_connections,
+                ),
+                headers={
+                    "content-type": "application/json",
+                    "X-RapidAPI-Key": self.api_key,
+                    "X-RapidAPI-Host": self.host,
+                },
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def translate(self, text: str) -> Union[str, None]:
+        """Concurrent calls for the same text share one upstream request"""
+        future = self._in_flight.get(text)
+        while future is not None:
+            metrics.translator_coalesced.inc()
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # the first waiter to wake up repeats the call, the others join it
+                future = self._in_flight.get(text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[text] = future
+        try:
+            result = (await self.translate_many([text]))[0]
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # a disconnected client must not fail the requests waiting on its call
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # the waiters, if any, get the error; without them it must not be logged as lost
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[text]
+
+    async def translate_many(self, texts: List[str]) -> List[Union[str, None]]:
+        """Translates many texts with one upstream request per batch_size texts.
+
+        The texts of a batch that fails get None, the batches translated before
+        and after it are kept. Raises TranslatorUnavailable only when no batch
+        was translated: TranslatorCircuitOpen when the breaker is open,
+        TranslatorBudgetExceeded when TRANSLATOR_BUDGET_PER_MINUTE is spent.
+        """
+        translations = []
+        error = None
+        for start in range(0, len(texts), self.batch_size):
+            chunk = texts[start:start + self.batch_size]
+            if isinstance(error, TranslatorBudgetExceeded):
+                # the budget does not refill between two batches
+                translations.extend([None] * len(chunk))
+                continue
+            try:
+                translations.extend(await self._translate_batch(chunk))
+            except TranslatorUnavailable as batch_error:
+                error = batch_error
+                translations.extend([None] * len(chunk))
+        if error is not None and not any(translations):
+            raise error
+        return translations
+
+    async def _translate_batch(self, chunk: List[str]) -> List[str]:
+        querystring = {"from": "en", "to[0]": "ru", "api-version": "3.0", "profanityAction": "NoAction",
+                       "textType": "plain"}
+        # calls failed fast by the breaker do not spend the budget
+        if not self.breaker.allow():
+            raise TranslatorCircuitOpen(self.breaker.retry_after())
+        try:
+            retry_after = await limiter.hit(
+                "translator", "global", settings.TRANSLATOR_BUDGET_PER_MINUTE, settings.TRANSLATOR_BUDGET_BURST
+            )
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        if retry_after:
+            self.breaker.release_probe()
+            raise TranslatorBudgetExceeded(retry_after)
+        payload = [{"Text": f"{text}"} for text in chunk]
+        metrics.translator_chars.inc(sum(len(text) for text in chunk))
+        try:
+            response = await self._post(payload, querystring)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        if response is None:
+            self.breaker.record_failure()
+            raise TranslatorUnavailable("translator request failed")
+        if response.status_code != 200:
+            # the translator is up and rejected this input, that says nothing about its health
+            self.breaker.release_probe()
+            raise TranslatorUnavailable(f"translator rejected the request: {response.status_code}")
+        self.breaker.record_success()
+        return [item["translations"][0]["text"].lower() for item in response.json()]
+
+    async def _post(self, payload: list, params: dict) -> Union[httpx.Response, None]:
+        """POST to the translator, retrying network errors, 429 and 5xx with exponential backoff.
+
+        Returns None when every attempt failed, other 4xx responses are returned as is.
+        """
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(self.url, json=payload, params=params)
+                metrics.translator_request_duration.observe(time.perf_counter() - start, status=response.status_code)
+                if response.status_code == 200:
+                    return response
+                metrics.translator_errors.inc(reason=response.status_code)
+                print("Ошибка при получении данных. Статус код: [rapid api]", response.status_code)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            except httpx.HTTPError as error:
+                metrics.translator_request_duration.observe(time.perf_counter() - start, status="error")
+                metrics.translator_errors.inc(reason=type(error).__name__)
+                print("Ошибка при выполненении запроса. Статус код: ", repr(error))
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+
+translator_client = TranslatorClient()
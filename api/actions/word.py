@@ -1,37 +1,161 @@
+import re
+from typing import Dict, List, Tuple, Union
+from uuid import UUID
+
 import pymorphy3
-import requests
+
+import metrics
+import settings
+from api.actions.translator import translator_client, TranslatorUnavailable
+from cache import LRUCache
+from db.dals import WordDAL
+from vocabulary_work.service import _get_translated_text
+
+# word -> (translation, pos)
+translation_cache = LRUCache(maxsize=settings.TRANSLATION_CACHE_SIZE, ttl=settings.TRANSLATION_CACHE_TTL)
+# translation -> pos
+pos_cache = LRUCache(maxsize=settings.POS_CACHE_SIZE)
+metrics.REGISTRY.register_cache("translation", translation_cache)
+metrics.REGISTRY.register_cache("pos", pos_cache)
+
+_NOT_CACHED = object()
+_morph_analyzer: Union[pymorphy3.MorphAnalyzer, None] = None
+
+
+def get_morph_analyzer() -> pymorphy3.MorphAnalyzer:
+    """Process-wide analyzer, the dictionaries are loaded only once"""
+    global _morph_analyzer
+    if _morph_analyzer is None:
+        _morph_analyzer = pymorphy3.MorphAnalyzer()
+    return _morph_analyzer
 
 
 class WordService:
     @staticmethod
     def get_part_of_speech(word: str):
-        morph = pymorphy3.MorphAnalyzer()
-        p = morph.parse(word)[0]
-        return p.tag.POS
+        if not word:
+            return None
+        pos = pos_cache.get(word, _NOT_CACHED)
+        if pos is _NOT_CACHED:
+            with metrics.pos_tagging_duration.time():
+                pos = get_morph_analyzer().parse(word)[0].tag.POS
+            pos_cache.set(word, pos)
+        return pos
+
+    @staticmethod
+    def get_parts_of_speech(words: List[str]) -> List[Union[str, None]]:
+        """Tags many strings at once, every distinct string is parsed at most once"""
+        tagged = {word: WordService.get_part_of_speech(word) for word in set(words)}
+        return [tagged[word] for word in words]
 
     # @staticmethod
     # def get_translated_text(text):
     #     return "коричневый"
 
     @staticmethod
-    def get_translated_text(text):
-        url = "https://microsoft-translator-text.p.rapidapi.com/translate"
-        api_key = "980166210cmsh67259c90ff4afe7p114dd7jsnc8259e9857d4"
-        #api_key = "0086541c90msh512ac39bbeb60eep1f23bejsn1fddf1acc235"
-        querystring = {"from": "en", "to[0]": "ru", "api-version": "3.0", "profanityAction": "NoAction",
-                       "textType": "plain"}
-        payload = [{"Text": f"{text}"}]
-        headers = {
-            "content-type": "application/json",
-            "X-RapidAPI-Key": api_key,
-            "X-RapidAPI-Host": "microsoft-translator-text.p.rapidapi.com"
+    async def get_translated_text(text):
+        translation = _get_translated_text(text)
+        if translation:
+            return translation
+        return await translator_client.translate(text)
+
+    @staticmethod
+    async def lookup_translation(
+            word: str,
+            word_dal: WordDAL
+    ) -> Tuple[Union[str, None], Union[str, None]]:
+        """Returns (translation, pos) for the word.
+
+        Looks in the in-process cache first, then in the translation table,
+        and only after that goes to the translator. Raises TranslatorUnavailable
+        when the word is found nowhere and the translator is down.
+
+        Must be called outside a transaction: the table is read in its own, so
+        the connection is back in the pool before the translator is called.
+        """
+        cached = translation_cache.get(word)
+        if cached is not None:
+            return cached
+
+        async with word_dal.db_session.begin():
+            translation_db = await word_dal.get_translation_by_word(word)
+        if translation_db:
+            result = (translation_db.translation, translation_db.pos)
+            translation_cache.set(word, result)
+            return result
+
+        translation = await WordService.get_translated_text(word)
+        if not translation:
+            return None, None
+        result = (translation, WordService.get_part_of_speech(translation))
+        translation_cache.set(word, result)
+        return result
+
+    @staticmethod
+    def lookup_translation_local(word: str) -> Tuple[Union[str, None], Union[str, None]]:
+        """(translation, pos) from the in-process cache or the offline dictionary, never does io"""
+        cached = translation_cache.get(word)
+        if cached is not None:
+            return cached
+        translation = _get_translated_text(word)
+        if not translation:
+            return None, None
+        result = (translation, WordService.get_part_of_speech(translation))
+        translation_cache.set(word, result)
+        return result
+
+    @staticmethod
+    async def lookup_translations(
+            word_ids: Dict[str, Union[UUID, None]],
+            word_dal: WordDAL
+    ) -> Dict[str, Tuple[Union[str, None], Union[str, None]]]:
+        """Batch version of lookup_translation for word -> word_id, None for words not in word_base.
+
+        Words found neither in the cache, the translation table nor the offline
+        dictionary are sent to the translator in batched requests. Like
+        lookup_translation it must be called outside a transaction.
+        """
+        result = {}
+        for word in word_ids:
+            cached = translation_cache.get(word)
+            if cached is not None:
+                result[word] = cached
+
+        not_cached = {
+            word_id: word for word, word_id in word_ids.items() if word not in result and word_id is not None
         }
-        try:
-            response = requests.post(url, json=payload, headers=headers, params=querystring)
-            if response.status_code == 200:
-                return response.json()[0]["translations"][0]["text"].lower()
-            else:
-                print("Ошибка при получении данных. Статус код: [rapid api]", response.status_code)
-        except requests.exceptions.RequestException as error:
-            print("Ошибка при выполненении запроса. Статус код: ", error)
+        if not_cached:
+            async with word_dal.db_session.begin():
+                translations_db = await word_dal.get_translations_for_words(list(not_cached))
+            for word_id, translation_db in translations_db.items():
+                result[not_cached[word_id]] = (translation_db.translation, translation_db.pos)
+                translation_cache.set(not_cached[word_id], result[not_cached[word_id]])
+
+        for word in word_ids:
+            if word not in result:
+                translation = _get_translated_text(word)
+                if translation:
+                    result[word] = (translation, WordService.get_part_of_speech(translation))
+                    translation_cache.set(word, result[word])
 
+        unknown = [word for word in word_ids if word not in result]
+        if unknown:
+            try:
+                # None for the words of the batches that failed, the others are kept
+                translations = await translator_client.translate_many(unknown)
+            except TranslatorUnavailable:
+                translations = [None] * len(unknown)
+            parts_of_speech = iter(WordService.get_parts_of_speech([t for t in translations if t]))
+            for word, translation in zip(unknown, translations):
+                if not translation:
+                    result[word] = (None, None)
+                    continue
+                result[word] = (translation, next(parts_of_speech))
+                translation_cache.set(word, result[word])
+        return result
+
+    @staticmethod
+    def normalize_words(words: List[str]) -> List[str]:
+        """Lowercases, trims and collapses whitespace, drops empty strings and duplicates keeping order"""
+        normalized = (re.sub(r"\s+", " ", word).strip().lower() for word in words)
+        return list(dict.fromkeys(word for word in normalized if word))
@@ -1,25 +1,36 @@
+import math
+import re
 import uuid
 from datetime import datetime
+from typing import Literal, Optional
 from uuid import UUID
 
 import fastapi
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.exc import IntegrityError
 
+import settings
+from api.actions.export import stream_export, EXPORT_MEDIA_TYPES
+from api.actions.pagination import encode_cursor, decode_cursor, naive_utc, vocabulary_etag
+from api.actions.translation_queue import translation_queue
+from api.actions.translator import TranslatorBudgetExceeded, TranslatorCircuitOpen, TranslatorUnavailable
 from api.actions.word import WordService
-from api.schemas import UserCreate, CustomTranslation
-from db.dals import get_user_dal, UserDAL, WordDAL, get_word_dal
+from api.schemas import UserCreate, CustomTranslation, PhraseBatch, ReviewGrade
+from db.dals import get_user_dal, UserDAL, WordDAL, get_word_dal, get_read_word_dal
 from db.db import create_user_in_db
 from db.db import users
 from db.models import User
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from api.actions.auth import get_current_user_from_token
-from db.session import get_db, transaction
+from api.actions.auth import get_current_user_from_token, get_user_id_from_token
+from db.session import get_db, transaction, ATOMIC
 
 from api.actions.auth import _get_user_by_email_for_auth
 from api.schemas import ShowUser
 from hashing import Hasher
+from vocabulary_work import importer
+from vocabulary_work.prefix_index import word_index
 from vocabulary_work.service import _get_translated_text
 
 user_router = APIRouter()
@@ -31,7 +42,7 @@ async def create_user(body: UserCreate, user_dal: UserDAL = Depends(get_user_dal
         user = await user_dal.create_user(
             name=body.name,
             email=body.email,
-            hashed_password=Hasher.get_password_hash(body.password),
+            hashed_password=await Hasher.async_get_password_hash(body.password),
         )
         return ShowUser(
             user_id=user.user_id,
@@ -56,42 +67,265 @@ async def get_user(current_user: User = Depends(get_current_user_from_token)):
 @user_router.post("/save-phrase")
 async def save_user_phrase(
         word: str,
+        deferred: bool = False,
         word_dal: WordDAL = Depends(get_word_dal),
         current_user: User = Depends(get_current_user_from_token)
 ):
+    """With deferred=true a word unknown locally is saved with translation_status "pending"
+    and translated in the background, the client picks the translation up from /my-words"""
+    word = word.lower()
+    if deferred and not translation_queue.full():
+        translation, pos = WordService.lookup_translation_local(word)
+        if not translation:
+            now = datetime.utcnow()
+            try:
+                async with word_dal.db_session.begin():
+                    new_user_word, claimed = await word_dal.save_pending_word_for_user(
+                        user_id=current_user.user_id,
+                        word=word,
+                        time=now,
+                        claimed_until=translation_queue.claimed_until(now),
+                    )
+                # without the claim another process already translates the bundle
+                if claimed and not translation_queue.enqueue(
+                    (new_user_word["bundle_id"], new_user_word["user_id"], new_user_word["word_id"], word)
+                ):
+                    # filled up since the check above, a later requeue picks the bundle up
+                    async with word_dal.db_session.begin():
+                        await word_dal.release_pending_bundles([new_user_word["bundle_id"]])
+            except IntegrityError as err:
+                raise HTTPException(status_code=503, detail=f"Database error: {err}")
+            return new_user_word
     try:
-        word = word.lower()
+        # may call the translator, so it runs before the transaction takes a connection
+        translation, pos = await WordService.lookup_translation(word, word_dal)
+        if not translation:
+            raise HTTPException(status_code=422, detail="Could not translate the word")
         async with word_dal.db_session.begin():
-            word_db = await word_dal.create_word(word=word)
-
-            translation = WordService.get_translated_text(word_db.word)
-            pos = WordService.get_part_of_speech(translation)
-
-            translation_db = await word_dal.set_translation(
-                word_id=word_db.word_id,
+            new_user_word = await word_dal.save_word_for_user(
+                user_id=current_user.user_id,
+                word=word,
                 translation=translation,
-                pos=pos
+                pos=pos,
+                time=datetime.utcnow(),
             )
-            new_user_word = await word_dal.set_bundle_for_user_words(
+    except TranslatorBudgetExceeded as err:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many translations, try again later",
+            headers={"Retry-After": str(math.ceil(err.retry_after))},
+        )
+    except TranslatorCircuitOpen as err:
+        raise HTTPException(
+            status_code=503,
+            detail="Translation service is unavailable, try again later",
+            headers={"Retry-After": str(math.ceil(err.retry_after))},
+        )
+    except TranslatorUnavailable:
+        raise HTTPException(status_code=503, detail="Translation service is unavailable, try again later")
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return new_user_word
+
+
+@user_router.post("/save-phrases")
+async def save_user_phrases(
+        body: PhraseBatch,
+        word_dal: WordDAL = Depends(get_word_dal),
+        current_user: User = Depends(get_current_user_from_token)
+):
+    words = WordService.normalize_words(body.words)
+    if not words:
+        raise HTTPException(status_code=422, detail="No words to save")
+    if len(words) > settings.MAX_PHRASES_PER_REQUEST:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Too many words, max {settings.MAX_PHRASES_PER_REQUEST} per request",
+        )
+    try:
+        # the translator is called with no transaction open, only the writes below hold one
+        async with word_dal.db_session.begin():
+            known = await word_dal.get_word_ids(words)
+        translations = await WordService.lookup_translations({word: known.get(word) for word in words}, word_dal)
+        translated = [word for word in words if translations[word][0]]
+        if not translated:
+            return {"saved": [], "untranslated": words}
+
+        async with word_dal.db_session.begin():
+            await word_dal.db_session.connection(execution_options=ATOMIC)
+            word_ids = await word_dal.create_words(translated)
+            translation_ids = await word_dal.set_translations([
+                (word_ids[word], *translations[word]) for word in translated
+            ])
+            saved = await word_dal.set_bundles_for_user_words(
                 user_id=current_user.user_id,
-                word_id=word_db.word_id,
-                translation_id=translation_db.translation_id,
+                bundles=[
+                    (word_ids[word], translation_ids[(word_ids[word], translations[word][0])])
+                    for word in translated
+                ],
                 time=datetime.utcnow(),
             )
-    except IntegrityError:
-        await word_dal.db_session.rollback()
-    return new_user_word
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return {"saved": saved, "untranslated": [word for word in words if not translations[word][0]]}
 
 
-@user_router.get("/my-words")
+@user_router.get("/my-words", response_class=ORJSONResponse)
 async def get_user_words(
+        request: Request,
+        limit: int = Query(100, ge=1, le=settings.MAX_WORDS_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        sort: Literal["time", "alphabet"] = "time",
+        is_favorite: Optional[bool] = None,
+        pos: Optional[str] = None,
+        added_from: Optional[datetime] = None,
+        added_to: Optional[datetime] = None,
+        since: Optional[int] = Query(None, ge=0),
         current_user: User = Depends(get_current_user_from_token),
         word_dal: WordDAL = Depends(get_word_dal)):
+    """Served from the primary: the version labels the rows sent with it, and
+    on a lagging replica a client would keep a version newer than its rows,
+    get 304 for them and never see the missing changes through `since`"""
+    try:
+        # the version is read before the rows, so a change committed in between
+        # is sent again on the next sync rather than lost
+        version = await word_dal.get_vocab_version(current_user.user_id)
+        etag = vocabulary_etag(current_user.user_id, version, str(request.query_params))
+        # no-cache makes the browser revalidate with If-None-Match instead of refetching
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        if since is not None:
+            changed, deleted = await word_dal.get_user_words_changes(current_user.user_id, since)
+            return ORJSONResponse({"version": version, "changed": changed, "deleted": deleted}, headers=headers)
+
+        words = await word_dal.get_user_words(
+            current_user.user_id,
+            limit=limit + 1,
+            after=decode_cursor(cursor, sort) if cursor else None,
+            sort=sort,
+            is_favorite=is_favorite,
+            pos=pos,
+            added_from=naive_utc(added_from),
+            added_to=naive_utc(added_to),
+        )
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    next_cursor = None
+    if len(words) > limit:
+        words = words[:limit]
+        last = words[-1]
+        next_cursor = encode_cursor(last["word"] if sort == "alphabet" else last["added_at"], last["bundle_id"])
+    # orjson encodes the uuids and datetimes itself, jsonable_encoder is skipped
+    return ORJSONResponse({"items": words, "next_cursor": next_cursor, "version": version}, headers=headers)
+
+
+@user_router.get("/my-words/export")
+async def export_user_words(
+        format: Literal["ndjson", "csv"] = "ndjson",
+        current_user: User = Depends(get_current_user_from_token)
+):
+    filename = f"fromboo-words-{datetime.utcnow():%Y-%m-%d}.{format}"
+    return StreamingResponse(
+        stream_export(current_user.user_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@user_router.get("/search", response_class=ORJSONResponse)
+async def search_user_words(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        current_user: User = Depends(get_current_user_from_token),
+        word_dal: WordDAL = Depends(get_read_word_dal)
+):
+    query = " ".join(q.split()).lower()
+    if not query:
+        raise HTTPException(status_code=422, detail="Empty search query")
+    try:
+        words = await word_dal.search_user_words(current_user.user_id, query, limit=limit + 1, offset=offset)
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    next_offset = offset + limit if len(words) > limit else None
+    return ORJSONResponse({"items": words[:limit], "next_offset": next_offset})
+
+
+@user_router.get("/autocomplete")
+async def autocomplete_word(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(10, ge=1, le=50),
+        user_id: str = Depends(get_user_id_from_token)
+):
+    """Words of word_base starting with q, served from the in-process prefix index"""
+    # a trailing space is kept: "ice " completes to "ice cream" but not to "iceberg"
+    prefix = re.sub(r"\s+", " ", q.lower()).lstrip()
+    return {"items": word_index.complete(prefix, limit)}
+
+
+@user_router.post("/import")
+async def import_user_words(
+        request: Request,
+        format: Literal["csv", "ndjson"] = "csv",
+        current_user: User = Depends(get_current_user_from_token)
+):
+    """Body is the raw file: csv rows of word,translation,pos or ndjson objects"""
+    too_large = HTTPException(
+        status_code=413, detail=f"The file is too large, max {settings.IMPORT_MAX_BYTES} bytes"
+    )
+    if int(request.headers.get("content-length") or 0) > settings.IMPORT_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.IMPORT_MAX_BYTES:
+            raise too_large
+    try:
+        rows = await importer.parse_upload(bytes(body), format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="The file must be utf-8")
+    except importer.InvalidImportFile as err:
+        raise HTTPException(status_code=422, detail=str(err))
+    if not rows:
+        raise HTTPException(status_code=422, detail="No words to import")
     try:
-        words = await word_dal.get_user_words(current_user.user_id)
-        return words
+        return await importer.import_words(current_user.user_id, rows)
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+
+
+@user_router.get("/review/next", response_class=ORJSONResponse)
+async def get_next_review(
+        n: int = Query(10, ge=1, le=100),
+        current_user: User = Depends(get_current_user_from_token),
+        word_dal: WordDAL = Depends(get_word_dal)
+):
+    # from the primary: on a lagging replica the card just graded would come back at once
+    try:
+        words = await word_dal.get_due_words(current_user.user_id, now=datetime.utcnow(), limit=n)
+    except IntegrityError as err:
+        raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    return ORJSONResponse({"items": words})
+
+
+@user_router.post("/review/grade")
+async def grade_review(
+        body: ReviewGrade,
+        word_dal: WordDAL = Depends(get_word_dal),
+        current_user: User = Depends(get_current_user_from_token)
+):
+    try:
+        async with word_dal.db_session.begin():
+            schedule = await word_dal.grade_review(
+                current_user.user_id, body.bundle_id, body.grade, now=datetime.utcnow()
+            )
     except IntegrityError as err:
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Word not found")
+    return schedule
 
 
 @user_router.patch("/set-custom-translation")
@@ -104,6 +338,7 @@ async def set_custom_translation(
         data.pos = WordService.get_part_of_speech(data.translation)
     try:
         async with word_dal.db_session.begin():
+            await word_dal.db_session.connection(execution_options=ATOMIC)
             translation_db = await word_dal.set_translation(
                 data.word_id,
                 data.translation,
@@ -129,6 +364,7 @@ async def delete_user_word(
 ):
     try:
         async with word_dal.db_session.begin():
+            await word_dal.db_session.connection(execution_options=ATOMIC)
             await word_dal.delete_user_bundle(current_user.user_id, word_id)
             return
     except IntegrityError as err:
@@ -144,6 +380,7 @@ async def change_is_favorite_for_word(
 ):
     try:
         async with word_dal.db_session.begin():
+            await word_dal.db_session.connection(execution_options=ATOMIC)
             await word_dal.update_word_favorite(current_user.user_id, word_id, is_favorite)
     except IntegrityError as err:
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
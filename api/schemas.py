@@ -1,8 +1,8 @@
 from datetime import datetime
-from typing import Optional, Union
+from typing import List, Optional, Union
 import uuid
 from fastapi import HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 from pydantic import EmailStr
 
 
@@ -56,4 +56,14 @@ class Token(TunedModel):
 class CustomTranslation(TunedModel):
     word_id: uuid.UUID
     translation: str
-    pos: str
\ No newline at end of file
+    pos: str
+
+
+class PhraseBatch(TunedModel):
+    words: List[str]
+
+
+class ReviewGrade(TunedModel):
+    bundle_id: uuid.UUID
+    # 0 - forgot completely .. 5 - perfect recall
+    grade: conint(ge=0, le=5)
@@ -0,0 +1,286 @@
+"""Load test and benchmark harness.
+
+Drives the app in-process (httpx ASGI transport) or over a real uvicorn
+server against the database from settings.REAL_DATABASE_URL, with the
+translator replaced by bench.stub_translator. Example:
+
+    python -m bench.run --scenarios login,my_words_1k --requests 300 --concurrency 20 \
+        --save bench/baselines/local.json --compare bench/baselines/previous.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import statistics
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, List
+
+import httpx
+import uvicorn
+
+import settings
+from bench.stub_translator import StubTranslator, install
+from db.dals import UserDAL, WordDAL
+from db.session import async_session, ATOMIC
+from hashing import Hasher
+from main import app
+
+PASSWORD = "bench-password"
+SCENARIOS = (
+    "login",
+    "refresh",
+    "save_phrase",
+    "save_phrase_concurrent",
+    "my_words_10",
+    "my_words_1k",
+    "my_words_50k",
+    "favorite_toggle",
+    "delete",
+)
+VOCABULARY_SIZES = {"my_words_10": 10, "my_words_1k": 1000, "my_words_50k": 50000}
+SEED_CHUNK = 1000
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def create_user(run_id: str, name: str) -> str:
+    email = f"bench-{run_id}-{name}@example.com"
+    async with async_session() as session:
+        async with session.begin():
+            await UserDAL(session).create_user(
+                name=f"bench {name}",
+                email=email,
+                hashed_password=Hasher.get_password_hash(PASSWORD),
+            )
+    return email
+
+
+async def seed_words(email: str, count: int) -> List[uuid.UUID]:
+    """Gives the user `count` translated words with multi-row inserts, returns their word ids"""
+    async with async_session() as session:
+        async with session.begin():
+            user = await UserDAL(session).get_user_by_email(email)
+        word_ids = []
+        for start in range(0, count, SEED_CHUNK):
+            words = [f"bench-word-{i}" for i in range(start, min(count, start + SEED_CHUNK))]
+            async with session.begin():
+                await session.connection(execution_options=ATOMIC)
+                word_dal = WordDAL(session)
+                ids = await word_dal.create_words(words)
+                translation_ids = await word_dal.set_translations(
+                    [(ids[word], f"перевод {word}", "NOUN") for word in words]
+                )
+                await word_dal.set_bundles_for_user_words(
+                    user_id=user.user_id,
+                    bundles=[(ids[word], translation_ids[(ids[word], f"перевод {word}")]) for word in words],
+                    time=datetime.utcnow(),
+                )
+            word_ids.extend(ids[word] for word in words)
+    return word_ids
+
+
+async def login(client: httpx.AsyncClient, email: str) -> httpx.Response:
+    response = await client.post("/login/token", data={"username": email, "password": PASSWORD})
+    response.raise_for_status()
+    return response
+
+
+async def auth_headers(client: httpx.AsyncClient, email: str) -> dict:
+    response = await login(client, email)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def measure(
+        make_request: Callable[[int], Awaitable[httpx.Response]],
+        requests: int,
+        concurrency: int,
+) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await make_request(i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "throughput_rps": requests / elapsed,
+    }
+
+
+async def run_scenario(name: str, client: httpx.AsyncClient, run_id: str, args) -> dict:
+    email = await create_user(run_id, name)
+    requests, concurrency = args.requests, args.concurrency
+
+    if name == "login":
+        return await measure(
+            lambda i: client.post("/login/token", data={"username": email, "password": PASSWORD}),
+            requests, concurrency,
+        )
+
+    if name == "refresh":
+        refresh_token = (await login(client, email)).cookies["refresh_token"]
+
+        async def refresh(i):
+            # the token rotates on every call, so refreshes of one user are sequential
+            nonlocal refresh_token
+            response = await client.post("/login/refresh", cookies={"refresh_token": refresh_token})
+            refresh_token = response.cookies.get("refresh_token", refresh_token)
+            return response
+        return await measure(refresh, requests, 1)
+
+    headers = await auth_headers(client, email)
+
+    if name == "save_phrase":
+        return await measure(
+            lambda i: client.post("/user/save-phrase", params={"word": f"{run_id}-{i}"}, headers=headers),
+            requests, 1,
+        )
+
+    if name == "save_phrase_concurrent":
+        # half of the saves hit the same few words, like a trending word does
+        return await measure(
+            lambda i: client.post(
+                "/user/save-phrase",
+                params={"word": f"{run_id}-hot-{i % 5}" if i % 2 else f"{run_id}-{i}"},
+                headers=headers,
+            ),
+            requests, concurrency,
+        )
+
+    if name in VOCABULARY_SIZES:
+        await seed_words(email, VOCABULARY_SIZES[name])
+        return await measure(
+            lambda i: client.get("/user/my-words", params={"limit": 100}, headers=headers),
+            requests, concurrency,
+        )
+
+    if name == "favorite_toggle":
+        word_ids = await seed_words(email, 100)
+        return await measure(
+            lambda i: client.patch(
+                "/user/change-favorite",
+                params={"word_id": str(word_ids[i % len(word_ids)]), "is_favorite": str(i % 2 == 0).lower()},
+                headers=headers,
+            ),
+            requests, concurrency,
+        )
+
+    if name == "delete":
+        word_ids = await seed_words(email, requests)
+        return await measure(
+            lambda i: client.delete("/user/delete-word", params={"word_id": str(word_ids[i])}, headers=headers),
+            requests, concurrency,
+        )
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\n{'scenario':<24}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current in results["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            change = (current[metric] - previous[metric]) / previous[metric] * 100 if previous[metric] else 0.0
+            print(f"{name:<24}{metric:<16}{previous[metric]:>12.2f}{current[metric]:>12.2f}{change:>+9.1f}%")
+
+
+async def main(args):
+    # every request comes from one ip and a few users, the limits would turn the runs into 429s
+    settings.RATE_LIMIT_ENABLED = args.rate_limit
+    stub = StubTranslator(latency=args.translator_latency, error_rate=args.translator_error_rate)
+    install(stub)
+    run_id = uuid.uuid4().hex[:8]
+
+    server = None
+    lifespan = contextlib.AsyncExitStack()
+    if args.uvicorn:
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60)
+    else:
+        # ASGITransport does not send lifespan events, the warm-up is run here like uvicorn does
+        await lifespan.enter_async_context(app.router.lifespan_context(app))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    scenarios = SCENARIOS if args.scenarios == "all" else args.scenarios.split(",")
+    results = {
+        "meta": {
+            "run_id": run_id,
+            "started_at": datetime.utcnow().isoformat(),
+            "transport": "uvicorn" if args.uvicorn else "asgi",
+            "python": platform.python_version(),
+            "translator_latency": args.translator_latency,
+            "translator_error_rate": args.translator_error_rate,
+            "rate_limit": args.rate_limit,
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in scenarios:
+            result = await run_scenario(name, client, run_id, args)
+            results["scenarios"][name] = result
+            print(f"{name:<24}p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                  f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_rps']:8.1f} rps  errors {result['errors']}")
+    finally:
+        await client.aclose()
+        await lifespan.aclose()
+        if server is not None:
+            server.should_exit = True
+            await serve_task
+    results["meta"]["translator_calls"] = stub.calls
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="fromboo benchmarks")
+    parser.add_argument("--scenarios", default="all", help=f"comma separated, any of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--translator-latency", type=float, default=0.15, help="stub translator latency, seconds")
+    parser.add_argument("--translator-error-rate", type=float, default=0.0)
+    parser.add_argument("--uvicorn", action="store_true", help="serve the app with uvicorn instead of in-process")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the rate limits on (off by default)")
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--compare", help="baseline json file to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
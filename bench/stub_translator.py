@@ -0,0 +1,35 @@
+import asyncio
+import random
+from typing import List, Union
+
+from api.actions.translator import translator_client, TranslatorUnavailable
+from api.actions.word import WordService
+
+
+class StubTranslator:
+    """Local stand-in for the rapid api translator with configurable latency and error rate"""
+
+    def __init__(self, latency: float = 0.1, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.texts = 0
+        self._random = random.Random(seed)
+
+    async def translate_many(self, texts: List[str]) -> List[Union[str, None]]:
+        self.calls += 1
+        self.texts += len(texts)
+        await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            raise TranslatorUnavailable("stub translator error")
+        return [f"перевод {text}" for text in texts]
+
+    async def translate(self, text: str) -> Union[str, None]:
+        return (await self.translate_many([text]))[0]
+
+
+def install(stub: StubTranslator):
+    """Routes every translator call of the app to the stub, nothing reaches the paid api"""
+    translator_client.translate = stub.translate
+    translator_client.translate_many = stub.translate_many
+    WordService.get_translated_text = staticmethod(stub.translate)
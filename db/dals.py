@@ -1,24 +1,189 @@
+import uuid
 from datetime import datetime, timedelta
-from typing import Union, AsyncGenerator
+from typing import Union, AsyncGenerator, AsyncIterator, Dict, List, Tuple
 from uuid import UUID
 
 from fastapi import Depends
 from sqlalchemy import and_
 from sqlalchemy import select
 from sqlalchemy import update
+from sqlalchemy import delete
+from sqlalchemy import tuple_
+from sqlalchemy import text
+from sqlalchemy import func, or_, case, cast, literal, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import aliased
+from sqlalchemy import event
+from sqlalchemy.orm import aliased, Session
 from sqlalchemy.sql.expression import exists
 
-from db.models import User, WordBase, Translation, UserWords, RefreshToken
-from db.session import get_db
+from db.models import User, WordBase, Translation, UserWords, RefreshToken, UserWordsTombstone
+from db.session import get_db, get_read_db
+from vocabulary_work.prefix_index import word_index
 
 
 ###########################################################
 # BLOCK FOR INTERACTION WITH DATABASE IN BUSINESS CONTEXT #
 ###########################################################
 
+SAVE_WORD_FOR_USER = text("""
+WITH word_row AS (
+    INSERT INTO word_base (word_id, word)
+    VALUES (CAST(:word_id AS uuid), CAST(:word AS varchar))
+    ON CONFLICT (word) DO UPDATE SET word = EXCLUDED.word
+    RETURNING word_id
+), translation_row AS (
+    INSERT INTO translation (translation_id, word_id, translation, pos)
+    SELECT CAST(:translation_id AS uuid), word_row.word_id, CAST(:translation AS varchar), CAST(:pos AS varchar)
+    FROM word_row
+    ON CONFLICT ON CONSTRAINT uq_word_id_and_translation DO UPDATE SET translation = EXCLUDED.translation
+    RETURNING translation_id, word_id
+), version_row AS (
+    UPDATE users SET vocab_version = vocab_version + 1
+    WHERE user_id = CAST(:user_id AS uuid)
+    RETURNING vocab_version
+)
+INSERT INTO user_words (bundle_id, user_id, word_id, translation_id, added_at, is_favorite, version)
+SELECT CAST(:bundle_id AS uuid), CAST(:user_id AS uuid), translation_row.word_id, translation_row.translation_id,
+       CAST(:added_at AS timestamp), false, version_row.vocab_version
+FROM translation_row, version_row
+ON CONFLICT ON CONSTRAINT uq_user_and_word_and_translation_id DO UPDATE SET version = EXCLUDED.version
+RETURNING bundle_id, user_id, word_id, translation_id, added_at, is_favorite, translation_status
+""")
+
+SAVE_PENDING_WORD_FOR_USER = text("""
+WITH word_row AS (
+    INSERT INTO word_base (word_id, word)
+    VALUES (CAST(:word_id AS uuid), CAST(:word AS varchar))
+    ON CONFLICT (word) DO UPDATE SET word = EXCLUDED.word
+    RETURNING word_id
+), version_row AS (
+    UPDATE users SET vocab_version = vocab_version + 1
+    WHERE user_id = CAST(:user_id AS uuid)
+    RETURNING vocab_version
+)
+INSERT INTO user_words (bundle_id, user_id, word_id, translation_id, translation_status, added_at, is_favorite,
+                        version, claimed_until)
+SELECT CAST(:bundle_id AS uuid), CAST(:user_id AS uuid), word_row.word_id, NULL, 'pending',
+       CAST(:added_at AS timestamp), false, version_row.vocab_version, CAST(:claimed_until AS timestamp)
+FROM word_row, version_row
+ON CONFLICT (user_id, word_id) WHERE translation_id IS NULL
+DO UPDATE SET version = EXCLUDED.version, translation_status = 'pending',
+    -- a live claim of another process is kept, that process translates the bundle
+    claimed_until = CASE
+        WHEN user_words.claimed_until > CAST(:added_at AS timestamp) THEN user_words.claimed_until
+        ELSE EXCLUDED.claimed_until
+    END
+RETURNING bundle_id, user_id, word_id, translation_id, added_at, is_favorite, translation_status, claimed_until
+""")
+
+# leases up to :limit pending bundles nobody holds; rows locked by another claimer are skipped, not waited for
+CLAIM_PENDING_BUNDLES = text("""
+WITH claimed AS (
+    UPDATE user_words SET claimed_until = CAST(:claimed_until AS timestamp)
+    WHERE bundle_id IN (
+        SELECT bundle_id FROM user_words
+        WHERE translation_status = 'pending'
+          AND (claimed_until IS NULL OR claimed_until < CAST(:now AS timestamp))
+        ORDER BY added_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING bundle_id, user_id, word_id
+)
+SELECT claimed.bundle_id, claimed.user_id, claimed.word_id, word_base.word
+FROM claimed JOIN word_base ON word_base.word_id = claimed.word_id
+""")
+
+FILL_PENDING_TRANSLATION = text("""
+WITH translation_row AS (
+    INSERT INTO translation (translation_id, word_id, translation, pos)
+    VALUES (CAST(:translation_id AS uuid), CAST(:word_id AS uuid), CAST(:translation AS varchar), CAST(:pos AS varchar))
+    ON CONFLICT ON CONSTRAINT uq_word_id_and_translation DO UPDATE SET translation = EXCLUDED.translation
+    RETURNING translation_id
+), version_row AS (
+    UPDATE users SET vocab_version = vocab_version + 1
+    WHERE user_id = CAST(:user_id AS uuid)
+    RETURNING vocab_version
+)
+UPDATE user_words
+SET translation_id = translation_row.translation_id,
+    translation_status = 'ready',
+    version = version_row.vocab_version,
+    claimed_until = NULL
+FROM translation_row, version_row
+WHERE user_words.bundle_id = CAST(:bundle_id AS uuid) AND user_words.translation_id IS NULL
+RETURNING user_words.bundle_id
+""")
+
+
+# bulk import: rows are COPYed into a temp table and merged with set-based statements
+CREATE_IMPORT_STAGING = text("""
+CREATE TEMP TABLE import_staging (
+    word varchar NOT NULL,
+    translation varchar NOT NULL,
+    pos varchar,
+    word_id uuid NOT NULL,
+    translation_id uuid NOT NULL,
+    bundle_id uuid NOT NULL
+) ON COMMIT DROP
+""")
+IMPORT_STAGING_COLUMNS = ("word", "translation", "pos", "word_id", "translation_id", "bundle_id")
+
+MERGE_IMPORT_WORDS = text("""
+INSERT INTO word_base (word_id, word)
+SELECT DISTINCT ON (s.word) s.word_id, s.word
+FROM import_staging s
+ON CONFLICT (word) DO NOTHING
+RETURNING word
+""")
+
+MERGE_IMPORT_TRANSLATIONS = text("""
+INSERT INTO translation (translation_id, word_id, translation, pos, is_custom)
+SELECT DISTINCT ON (word_base.word_id, s.translation) s.translation_id, word_base.word_id, s.translation, s.pos, true
+FROM import_staging s
+JOIN word_base ON word_base.word = s.word
+ON CONFLICT ON CONSTRAINT uq_word_id_and_translation DO NOTHING
+""")
+
+MERGE_IMPORT_USER_WORDS = text("""
+WITH inserted AS (
+    INSERT INTO user_words (bundle_id, user_id, word_id, translation_id, added_at, is_favorite, version)
+    SELECT s.bundle_id, CAST(:user_id AS uuid), word_base.word_id, translation.translation_id,
+           CAST(:added_at AS timestamp), false, CAST(:version AS bigint)
+    FROM import_staging s
+    JOIN word_base ON word_base.word = s.word
+    JOIN translation ON translation.word_id = word_base.word_id AND translation.translation = s.translation
+    ON CONFLICT ON CONSTRAINT uq_user_and_word_and_translation_id DO NOTHING
+    RETURNING 1
+)
+SELECT count(*) FROM inserted
+""")
+
+# the translation shared by every user of a word: machine translations first, then the earliest
+CANONICAL_TRANSLATION_ORDER = (Translation.is_custom, Translation.created_at, Translation.translation_id)
+
+# keys of a bundle in the /user/my-words responses
+USER_WORD_FIELDS = (
+    "bundle_id", "word_id", "word", "translation", "part_of_speech", "added_at", "is_favorite", "translation_status",
+)
+
+# session.info key of the words waiting for a commit before they are added to the prefix index
+NEW_WORDS_KEY = "new_words"
+
+
+@event.listens_for(Session, "after_commit")
+def _index_committed_words(session):
+    words = session.info.pop(NEW_WORDS_KEY, None)
+    if words:
+        word_index.add_many(words)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_words(session):
+    session.info.pop(NEW_WORDS_KEY, None)
+
 
 class UserDAL:
     """Data Access Layer for operating user info"""
@@ -62,6 +227,19 @@ class UserDAL:
             return user_row[0]
 
 
+    async def update_user(self, user_id: UUID, **kwargs) -> Union[User, None]:
+        query = (
+            update(User)
+            .where(User.user_id == user_id)
+            .values(kwargs)
+            .returning(User.user_id)
+        )
+        res = await self.db_session.execute(query)
+        update_user_id_row = res.fetchone()
+        if update_user_id_row is not None:
+            return await self.get_user_by_id(update_user_id_row[0])
+
+
 async def get_user_dal(db_session: AsyncSession = Depends(get_db)) -> AsyncGenerator[UserDAL, None]:
     yield UserDAL(db_session)
 
@@ -72,12 +250,17 @@ class WordDAL:
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
+    def _index_after_commit(self, words: List[str]):
+        """Words inserted into word_base go to the autocomplete index once the transaction commits"""
+        self.db_session.info.setdefault(NEW_WORDS_KEY, []).extend(words)
+
     async def create_word(self, word: str) -> WordBase:
         new_word = await self.get_word_in_word_db(word)
         if not new_word:
             new_word = WordBase(word=word)
             self.db_session.add(new_word)
             await self.db_session.flush()
+            self._index_after_commit([word])
         return new_word
 
     async def get_word_in_word_db(self, word: str) -> Union[WordBase, None]:
@@ -87,11 +270,92 @@ class WordDAL:
         if word_row:
             return word_row[0]
 
+    async def create_words(self, words: List[str]) -> Dict[str, UUID]:
+        """Returns word -> word_id, inserting the missing words with one multi-row INSERT"""
+        word_ids = await self.get_word_ids(words)
+        missing = [word for word in words if word not in word_ids]
+        if missing:
+            stmt = (
+                pg_insert(WordBase)
+                .values([{"word_id": uuid.uuid4(), "word": word} for word in missing])
+                .on_conflict_do_nothing(index_elements=[WordBase.word])
+                .returning(WordBase.word, WordBase.word_id)
+            )
+            result = await self.db_session.execute(stmt)
+            inserted = dict(result.all())
+            word_ids.update(inserted)
+            self._index_after_commit(list(inserted))
+            # inserted concurrently by another request
+            raced = [word for word in missing if word not in word_ids]
+            if raced:
+                word_ids.update(await self.get_word_ids(raced))
+        return word_ids
+
+    async def stream_words(self, fetch_size: int) -> AsyncIterator[List[str]]:
+        """Every word of word_base, fetch_size per partition; must run inside a transaction"""
+        result = await self.db_session.stream(select(WordBase.word).execution_options(yield_per=fetch_size))
+        async for partition in result.partitions():
+            yield [word for word, in partition]
+
+    async def get_word_ids(self, words: List[str]) -> Dict[str, UUID]:
+        query = select(WordBase.word, WordBase.word_id).where(WordBase.word.in_(words))
+        result = await self.db_session.execute(query)
+        return dict(result.all())
+
     async def translation_exists(self, word_id: UUID, translation: str) -> Union[Translation, None]:
         stmt = select(Translation).filter_by(word_id=word_id, translation=translation)
         result = await self.db_session.execute(stmt)
         return result.scalars().first()
 
+    async def get_translation_by_word(self, word: str) -> Union[Translation, None]:
+        stmt = (
+            select(Translation)
+            .join(WordBase, Translation.word_id == WordBase.word_id)
+            .where(WordBase.word == word)
+            .order_by(*CANONICAL_TRANSLATION_ORDER)
+            .limit(1)
+        )
+        result = await self.db_session.execute(stmt)
+        return result.scalars().first()
+
+    async def get_translations_for_words(self, word_ids: List[UUID]) -> Dict[UUID, Translation]:
+        """Returns the canonical translation of every word_id that has one"""
+        stmt = (
+            select(Translation)
+            .where(Translation.word_id.in_(word_ids))
+            .distinct(Translation.word_id)
+            .order_by(Translation.word_id, *CANONICAL_TRANSLATION_ORDER)
+        )
+        result = await self.db_session.execute(stmt)
+        return {translation.word_id: translation for translation in result.scalars()}
+
+    async def set_translations(
+            self,
+            translations: List[Tuple[UUID, str, str]]
+    ) -> Dict[Tuple[UUID, str], UUID]:
+        """Takes (word_id, translation, pos) and returns (word_id, translation) -> translation_id"""
+        stmt = (
+            pg_insert(Translation)
+            .values([
+                {"translation_id": uuid.uuid4(), "word_id": word_id, "translation": translation, "pos": pos}
+                for word_id, translation, pos in translations
+            ])
+            .on_conflict_do_nothing(constraint="uq_word_id_and_translation")
+            .returning(Translation.word_id, Translation.translation, Translation.translation_id)
+        )
+        result = await self.db_session.execute(stmt)
+        translation_ids = {(row.word_id, row.translation): row.translation_id for row in result}
+        existing = [(word_id, translation) for word_id, translation, _ in translations
+                    if (word_id, translation) not in translation_ids]
+        if existing:
+            query = (
+                select(Translation.word_id, Translation.translation, Translation.translation_id)
+                .where(tuple_(Translation.word_id, Translation.translation).in_(existing))
+            )
+            result = await self.db_session.execute(query)
+            translation_ids.update({(row.word_id, row.translation): row.translation_id for row in result})
+        return translation_ids
+
     async def set_translation(self,
                               word_id: UUID,
                               translation: str,
@@ -104,7 +368,8 @@ class WordDAL:
         new_translation = Translation(
             word_id=word_id,
             translation=translation,
-            pos=pos
+            pos=pos,
+            is_custom=True
         )
         self.db_session.add(new_translation)
         try:
@@ -113,60 +378,439 @@ class WordDAL:
         except IntegrityError:
             await self.db_session.rollback()
 
-    async def get_user_words(self, user_id):
+    async def get_user_words(
+            self,
+            user_id: UUID,
+            limit: int = 100,
+            after: Union[tuple, None] = None,
+            sort: str = "time",
+            is_favorite: Union[bool, None] = None,
+            pos: Union[str, None] = None,
+            added_from: Union[datetime, None] = None,
+            added_to: Union[datetime, None] = None,
+    ) -> List[dict]:
+        """One page of the user's words.
+
+        Keyset pagination: `after` is the (sort value, bundle_id) of the last
+        row of the previous page. "time" sorts newest first, "alphabet" by word.
+        """
         Word = aliased(WordBase)
         TranslationAlias = aliased(Translation)
 
+        stmt = (
+            self._user_words_select(Word, TranslationAlias)
+            .filter(UserWords.user_id == user_id)
+        )
+        if is_favorite is not None:
+            stmt = stmt.filter(UserWords.is_favorite == is_favorite)
+        if pos:
+            stmt = stmt.filter(TranslationAlias.pos == pos)
+        if added_from:
+            stmt = stmt.filter(UserWords.added_at >= added_from)
+        if added_to:
+            stmt = stmt.filter(UserWords.added_at < added_to)
+
+        if sort == "alphabet":
+            if after:
+                stmt = stmt.filter(tuple_(Word.word, UserWords.bundle_id) > after)
+            stmt = stmt.order_by(Word.word, UserWords.bundle_id)
+        else:
+            if after:
+                stmt = stmt.filter(tuple_(UserWords.added_at, UserWords.bundle_id) < after)
+            stmt = stmt.order_by(UserWords.added_at.desc(), UserWords.bundle_id.desc())
+
+        return await self._fetch_user_words(stmt.limit(limit))
+
+    async def get_user_words_changes(self, user_id: UUID, since: int) -> Tuple[List[dict], List[UUID]]:
+        """Bundles added or changed after the `since` vocabulary version and ids of the deleted ones"""
+        stmt = (
+            self._user_words_select(WordBase, Translation)
+            .filter(UserWords.user_id == user_id, UserWords.version > since)
+            .order_by(UserWords.version)
+        )
+        changed = await self._fetch_user_words(stmt)
+
+        stmt = (
+            select(UserWordsTombstone.bundle_id)
+            .filter(UserWordsTombstone.user_id == user_id, UserWordsTombstone.version > since)
+        )
+        result = await self.db_session.execute(stmt)
+        return changed, list(result.scalars())
+
+    async def stream_user_words(self, user_id: UUID, fetch_size: int) -> AsyncIterator[list]:
+        """All words of the user through a server-side cursor, fetch_size rows per partition.
+
+        Rows are plain (word, translation, pos, is_favorite, translation_status, added_at)
+        tuples; must run inside a transaction, asyncpg opens cursors only there.
+        """
         stmt = (
             select(
-                UserWords,
-                Word.word_id,
-                Word.word,
-                TranslationAlias.pos,
-                TranslationAlias.translation
+                WordBase.word,
+                Translation.translation,
+                Translation.pos,
+                UserWords.is_favorite,
+                UserWords.translation_status,
+                UserWords.added_at,
             )
             .filter(UserWords.user_id == user_id)
-            .join(Word, UserWords.word_id == Word.word_id)
-            .join(TranslationAlias, UserWords.translation_id == TranslationAlias.translation_id)
+            .join(WordBase, UserWords.word_id == WordBase.word_id)
+            .outerjoin(Translation, UserWords.translation_id == Translation.translation_id)
+            .order_by(UserWords.added_at, UserWords.bundle_id)
+            .execution_options(yield_per=fetch_size)
+        )
+        result = await self.db_session.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
+    async def search_user_words(self, user_id: UUID, query: str, limit: int, offset: int) -> List[dict]:
+        """The user's words whose word or translation is similar to or contains the query, best first"""
+        return await self._fetch_user_words(self._search_select(user_id, query, limit, offset))
+
+    @staticmethod
+    def _search_select(user_id: UUID, query: str, limit: int, offset: int):
+        """An OR over columns of two joined tables can use neither pg_trgm GIN
+        index, so the matches are a UNION of one subquery per table: each
+        filters a single column, which its GIN index serves with a bitmap scan,
+        and is joined back to the user's bundles.
+        """
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        word_matches = (
+            select(UserWords.bundle_id)
+            .join(WordBase, UserWords.word_id == WordBase.word_id)
+            .where(UserWords.user_id == user_id, or_(WordBase.word.op("%")(query), WordBase.word.ilike(pattern)))
+        )
+        translation_matches = (
+            select(UserWords.bundle_id)
+            .join(Translation, UserWords.translation_id == Translation.translation_id)
+            .where(
+                UserWords.user_id == user_id,
+                or_(Translation.translation.op("%")(query), Translation.translation.ilike(pattern)),
+            )
+        )
+        score = func.greatest(
+            func.similarity(WordBase.word, query),
+            func.coalesce(func.similarity(Translation.translation, query), 0),
+        )
+        return (
+            WordDAL._user_words_select(WordBase, Translation)
+            .filter(UserWords.bundle_id.in_(word_matches.union(translation_matches)))
+            .order_by(score.desc(), WordBase.word, UserWords.bundle_id)
+            .limit(limit)
+            .offset(offset)
+        )
+
+    async def get_due_words(self, user_id: UUID, now: datetime, limit: int) -> List[dict]:
+        """Translated bundles due for review, most overdue first, read from ix_user_words_user_id_due_at"""
+        stmt = (
+            self._user_words_select(WordBase, Translation)
+            .filter(
+                UserWords.user_id == user_id,
+                UserWords.due_at <= now,
+                UserWords.translation_id.is_not(None),
+            )
+            .order_by(UserWords.due_at)
+            .limit(limit)
+        )
+        return await self._fetch_user_words(stmt)
+
+    async def grade_review(self, user_id: UUID, bundle_id: UUID, grade: int, now: datetime) -> Union[dict, None]:
+        """Reschedules the bundle by the SM-2 algorithm in one UPDATE, grade is 0 (forgot) .. 5 (perfect).
+
+        A grade below 3 starts the repetitions over, otherwise the interval
+        goes 1 day, 6 days, then the previous interval times the ease.
+        """
+        if grade < 3:
+            interval_days = literal(1)
+        else:
+            interval_days = case(
+                (UserWords.repetitions == 0, 1),
+                (UserWords.repetitions == 1, 6),
+                else_=cast(func.ceil(UserWords.interval_days * UserWords.ease), Integer),
+            )
+        stmt = (
+            update(UserWords)
+            .where(UserWords.bundle_id == bundle_id, UserWords.user_id == user_id)
+            .values(
+                repetitions=UserWords.repetitions + 1 if grade >= 3 else 0,
+                interval_days=interval_days,
+                ease=func.greatest(1.3, UserWords.ease + (0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))),
+                due_at=now + func.make_interval(0, 0, 0, interval_days),
+            )
+            .returning(
+                UserWords.bundle_id,
+                UserWords.ease,
+                UserWords.interval_days,
+                UserWords.repetitions,
+                UserWords.due_at,
+            )
         )
         result = await self.db_session.execute(stmt)
-        return [
-            {
-                "word_id": row.word_id,
-                "word": row.word,
-                "translation": row.translation,
-                "part_of_speech": row.pos,
-                "added_at": row.UserWords.added_at,
-                "is_favorite": row.UserWords.is_favorite
-            }
-            for row in result.fetchall()
-        ]
+        row = result.mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _user_words_select(word, translation):
+        """Plain columns in USER_WORD_FIELDS order, no ORM entities to build"""
+        return (
+            select(
+                UserWords.bundle_id,
+                word.word_id,
+                word.word,
+                translation.translation,
+                translation.pos,
+                UserWords.added_at,
+                UserWords.is_favorite,
+                UserWords.translation_status,
+            )
+            .join(word, UserWords.word_id == word.word_id)
+            .outerjoin(translation, UserWords.translation_id == translation.translation_id)
+        )
+
+    async def _fetch_user_words(self, stmt) -> List[dict]:
+        # executed on the connection: core rows, no ORM result processing or identity map
+        connection = await self.db_session.connection()
+        result = await connection.execute(stmt)
+        return [dict(zip(USER_WORD_FIELDS, row)) for row in result]
+
+    async def get_vocab_version(self, user_id: UUID) -> int:
+        query = select(User.vocab_version).where(User.user_id == user_id)
+        result = await self.db_session.execute(query)
+        return result.scalar() or 0
+
+    async def bump_vocab_version(self, user_id: UUID) -> int:
+        """Must run in the same transaction as the change it marks"""
+        stmt = (
+            update(User)
+            .where(User.user_id == user_id)
+            .values(vocab_version=User.vocab_version + 1)
+            .returning(User.vocab_version)
+        )
+        result = await self.db_session.execute(stmt)
+        return result.scalar_one()
 
     async def set_bundle_for_user_words(self,
                                         user_id: UUID,
                                         word_id: UUID,
                                         translation_id: UUID,
                                         time: datetime
-                                        ) -> Union[UserWords, None]:
+                                        ) -> UserWords:
+        """An IntegrityError aborts the caller's transaction, so it is raised, not swallowed"""
         new_bundle = UserWords(
             user_id=user_id,
             word_id=word_id,
             translation_id=translation_id,
-            added_at=time
+            added_at=time,
+            version=await self.bump_vocab_version(user_id)
         )
         self.db_session.add(new_bundle)
-        try:
-            await self.db_session.flush()
-        except IntegrityError:
-            ...
+        await self.db_session.flush()
         return new_bundle
 
+    async def save_word_for_user(self,
+                                 user_id: UUID,
+                                 word: str,
+                                 translation: str,
+                                 pos: Union[str, None],
+                                 time: datetime
+                                 ) -> dict:
+        """Resolves or creates the word, its translation and the user's bundle in one statement.
+
+        Every INSERT ends with ON CONFLICT DO UPDATE to an unchanged value, so it
+        returns the existing row instead of nothing and concurrent saves of the
+        same word never raise IntegrityError.
+        """
+        result = await self.db_session.execute(
+            SAVE_WORD_FOR_USER,
+            {
+                "word_id": uuid.uuid4(),
+                "word": word,
+                "translation_id": uuid.uuid4(),
+                "translation": translation,
+                "pos": pos,
+                "bundle_id": uuid.uuid4(),
+                "user_id": user_id,
+                "added_at": time,
+            },
+        )
+        self._index_after_commit([word])
+        return dict(result.mappings().one())
+
+    async def save_pending_word_for_user(self,
+                                         user_id: UUID,
+                                         word: str,
+                                         time: datetime,
+                                         claimed_until: datetime
+                                         ) -> Tuple[dict, bool]:
+        """Saves the word and a bundle without translation in one statement, the translation comes later.
+
+        The bundle is claimed by the caller until `claimed_until` unless another
+        process already holds it; returns the bundle and whether the claim is ours.
+        """
+        result = await self.db_session.execute(
+            SAVE_PENDING_WORD_FOR_USER,
+            {
+                "word_id": uuid.uuid4(),
+                "word": word,
+                "bundle_id": uuid.uuid4(),
+                "user_id": user_id,
+                "added_at": time,
+                "claimed_until": claimed_until,
+            },
+        )
+        self._index_after_commit([word])
+        bundle = dict(result.mappings().one())
+        return bundle, bundle.pop("claimed_until") == claimed_until
+
+    async def fill_pending_translation(self,
+                                       bundle_id: UUID,
+                                       user_id: UUID,
+                                       word_id: UUID,
+                                       translation: str,
+                                       pos: Union[str, None]
+                                       ) -> bool:
+        """Sets the translation of a pending bundle, False when the bundle is gone or already translated"""
+        result = await self.db_session.execute(
+            FILL_PENDING_TRANSLATION,
+            {
+                "translation_id": uuid.uuid4(),
+                "word_id": word_id,
+                "translation": translation,
+                "pos": pos,
+                "user_id": user_id,
+                "bundle_id": bundle_id,
+            },
+        )
+        return result.first() is not None
+
+    async def mark_translation_failed(self, bundle_id: UUID, user_id: UUID):
+        stmt = (
+            update(UserWords)
+            .where(UserWords.bundle_id == bundle_id, UserWords.translation_id.is_(None))
+            .values(
+                translation_status="failed",
+                claimed_until=None,
+                version=await self.bump_vocab_version(user_id),
+            )
+        )
+        await self.db_session.execute(stmt)
+
+    async def claim_pending_bundles(self,
+                                    limit: int,
+                                    now: datetime,
+                                    claimed_until: datetime
+                                    ) -> List[Tuple[UUID, UUID, UUID, str]]:
+        """(bundle_id, user_id, word_id, word) of up to `limit` pending bundles, leased to the caller.
+
+        A bundle whose lease ran out (its process died or dropped it) is claimed again.
+        """
+        result = await self.db_session.execute(
+            CLAIM_PENDING_BUNDLES, {"limit": limit, "now": now, "claimed_until": claimed_until}
+        )
+        return [tuple(row) for row in result]
+
+    async def release_pending_bundles(self, bundle_ids: List[UUID]):
+        """Drops the leases, so the next requeue of any process picks the bundles up"""
+        stmt = (
+            update(UserWords)
+            .where(UserWords.bundle_id.in_(bundle_ids), UserWords.translation_status == "pending")
+            .values(claimed_until=None)
+        )
+        await self.db_session.execute(stmt)
+
+    async def delete_bundle_by_id(self, user_id: UUID, bundle_id: UUID) -> bool:
+        stmt = select(UserWords).filter_by(user_id=user_id, bundle_id=bundle_id)
+        result = await self.db_session.execute(stmt)
+        bundle = result.scalars().first()
+
+        if bundle:
+            self.db_session.add(UserWordsTombstone(
+                bundle_id=bundle.bundle_id,
+                user_id=user_id,
+                word_id=bundle.word_id,
+                version=await self.bump_vocab_version(user_id),
+            ))
+            await self.db_session.delete(bundle)
+            await self.db_session.flush()
+            return True
+        return False
+
+    async def set_bundles_for_user_words(self,
+                                         user_id: UUID,
+                                         bundles: List[Tuple[UUID, UUID]],
+                                         time: datetime
+                                         ) -> List[dict]:
+        """Takes (word_id, translation_id) pairs, returns the bundles that were not saved before"""
+        version = await self.bump_vocab_version(user_id)
+        stmt = (
+            pg_insert(UserWords)
+            .values([
+                {
+                    "bundle_id": uuid.uuid4(),
+                    "user_id": user_id,
+                    "word_id": word_id,
+                    "translation_id": translation_id,
+                    "added_at": time,
+                    "is_favorite": False,
+                    "version": version,
+                }
+                for word_id, translation_id in bundles
+            ])
+            .on_conflict_do_nothing(constraint="uq_user_and_word_and_translation_id")
+            .returning(
+                UserWords.bundle_id,
+                UserWords.user_id,
+                UserWords.word_id,
+                UserWords.translation_id,
+                UserWords.added_at,
+                UserWords.is_favorite,
+            )
+        )
+        result = await self.db_session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+    async def import_user_words(self,
+                                user_id: UUID,
+                                rows: List[Tuple[str, str, Union[str, None]]],
+                                time: datetime
+                                ) -> int:
+        """Merges (word, translation, pos) rows into the user's vocabulary, returns the number of new bundles.
+
+        The rows are streamed into a temp table with COPY, so it must run inside
+        a transaction; word_base, translation and user_words are then filled by
+        one INSERT ... SELECT each.
+        """
+        await self.db_session.execute(CREATE_IMPORT_STAGING)
+        connection = await self.db_session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "import_staging",
+            records=[
+                (word, translation, pos, uuid.uuid4(), uuid.uuid4(), uuid.uuid4())
+                for word, translation, pos in rows
+            ],
+            columns=IMPORT_STAGING_COLUMNS,
+        )
+        result = await self.db_session.execute(MERGE_IMPORT_WORDS)
+        self._index_after_commit(list(result.scalars()))
+        await self.db_session.execute(MERGE_IMPORT_TRANSLATIONS)
+        result = await self.db_session.execute(
+            MERGE_IMPORT_USER_WORDS,
+            {"user_id": user_id, "added_at": time, "version": await self.bump_vocab_version(user_id)},
+        )
+        return result.scalar_one()
+
     async def delete_user_bundle(self, user_id: UUID, word_id: UUID):
         stmt = select(UserWords).filter_by(user_id=user_id, word_id=word_id)
         result = await self.db_session.execute(stmt)
         bundle = result.scalars().first()
 
         if bundle:
+            self.db_session.add(UserWordsTombstone(
+                bundle_id=bundle.bundle_id,
+                user_id=user_id,
+                word_id=word_id,
+                version=await self.bump_vocab_version(user_id),
+            ))
             await self.db_session.delete(bundle)
             await self.db_session.flush()
             return True
@@ -178,6 +822,7 @@ class WordDAL:
         user_word = result.scalars().first()
         if user_word:
             user_word.is_favorite = is_favorite
+            user_word.version = await self.bump_vocab_version(user_id)
         else:
             raise IntegrityError(f"UserWord с user_id={user_id} и word_id={word_id} не найден")
 
@@ -186,50 +831,51 @@ async def get_word_dal(db_session: AsyncSession = Depends(get_db)) -> AsyncGener
     yield WordDAL(db_session)
 
 
+async def get_read_word_dal(db_session: AsyncSession = Depends(get_read_db)) -> AsyncGenerator[WordDAL, None]:
+    """WordDAL on the read replica, only for read-only methods"""
+    yield WordDAL(db_session)
+
+
 class TokenDAL:
 
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
-    async def save_token(self, user_id: UUID, token: UUID, token_expires: timedelta, ip_address: str) -> Union[RefreshToken, None]:
-        try:
-            expires_at = datetime.utcnow() + token_expires
-
-            # Попытка обновить существующую запись
-            stmt = (
-                update(RefreshToken)
-                .where(RefreshToken.user_id == user_id)
-                .values(
-                    token=token,
-                    expires_at=expires_at,
-                    ip_address=ip_address,
-                    registered_at=datetime.utcnow()
-                )
-                .returning(RefreshToken)
+    async def save_token(self, user_id: UUID, token: UUID, token_expires: timedelta, ip_address: str) -> RefreshToken:
+        """Rotates the user's refresh token with a single upsert"""
+        now = datetime.utcnow()
+        stmt = pg_insert(RefreshToken).values(
+            token=token,
+            user_id=user_id,
+            expires_at=now + token_expires,
+            ip_address=ip_address,
+            registered_at=now,
+        )
+        stmt = (
+            stmt.on_conflict_do_update(
+                index_elements=[RefreshToken.user_id],
+                set_={
+                    "token": stmt.excluded.token,
+                    "expires_at": stmt.excluded.expires_at,
+                    "ip_address": stmt.excluded.ip_address,
+                    "registered_at": stmt.excluded.registered_at,
+                },
             )
-
-            result = await self.db_session.execute(stmt)
-            updated_token = result.scalar_one_or_none()
-
-            # Если обновление не произошло, создаём новую запись
-            if updated_token is None:
-                new_token_data = RefreshToken(
-                    token=token,
-                    user_id=user_id,
-                    expires_at=expires_at,
-                    ip_address=ip_address
-                )
-                self.db_session.add(new_token_data)
-                await self.db_session.flush()
-                await self.db_session.commit()
-                return new_token_data
-
-            await self.db_session.commit()
-            return updated_token
-
-        except IntegrityError:
-            await self.db_session.rollback()
-            return None
+            .returning(RefreshToken)
+        )
+        result = await self.db_session.execute(stmt)
+        return result.scalar_one()
+
+    async def delete_expired_tokens(self, batch_size: int) -> int:
+        """Deletes at most batch_size expired tokens, returns how many were deleted"""
+        expired = (
+            select(RefreshToken.token)
+            .where(RefreshToken.expires_at < datetime.utcnow())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await self.db_session.execute(delete(RefreshToken).where(RefreshToken.token.in_(expired)))
+        return result.rowcount
 
     async def get_token_data(self, token: str) -> Union[RefreshToken, None]:
         query = select(RefreshToken).where(RefreshToken.token == token)
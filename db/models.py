@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, ForeignKey, UniqueConstraint
-from sqlalchemy import Boolean, TIMESTAMP
+from sqlalchemy import Column, String, ForeignKey, UniqueConstraint, Index, text
+from sqlalchemy import Boolean, TIMESTAMP, BigInteger, Float, Integer
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -16,6 +16,8 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     is_active = Column(Boolean(), default=True)
     hashed_password = Column(String, nullable=False)
+    # bumped on every change of the user's vocabulary, used for delta sync and ETags
+    vocab_version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
 
 class RefreshToken(Base):
@@ -24,7 +26,7 @@ class RefreshToken(Base):
     token = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id'), unique=True)
     registered_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
-    expires_at = Column(TIMESTAMP, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
     ip_address = Column(String, nullable=False)
 
 
@@ -34,6 +36,11 @@ class WordBase(Base):
     word_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     word = Column(String, nullable=False, unique=True)
 
+    __table_args__ = (
+        # pg_trgm index for /user/search, serves both % (similarity) and ILIKE '%...%'
+        Index('ix_word_base_word_trgm', 'word', postgresql_using='gin', postgresql_ops={'word': 'gin_trgm_ops'}),
+    )
+
 
 class Translation(Base):
     __tablename__ = "translation"
@@ -42,9 +49,16 @@ class Translation(Base):
     word_id = Column(UUID(as_uuid=True), ForeignKey('word_base.word_id'), nullable=False)
     translation = Column(String, nullable=False)
     pos = Column(String)
+    # set by users (custom translation, import); lookups prefer the machine ones, the earliest first
+    is_custom = Column(Boolean(), nullable=False, default=False, server_default=text("false"))
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow,
+                        server_default=text("timezone('utc', now())"))
 
     __table_args__ = (
         UniqueConstraint('word_id', 'translation', name='uq_word_id_and_translation'),
+        Index('ix_translation_word_id_canonical', 'word_id', 'is_custom', 'created_at', 'translation_id'),
+        Index('ix_translation_translation_trgm', 'translation', postgresql_using='gin',
+              postgresql_ops={'translation': 'gin_trgm_ops'}),
     )
 
 
@@ -54,10 +68,47 @@ class UserWords(Base):
     bundle_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id'), nullable=False)
     word_id = Column(UUID(as_uuid=True), ForeignKey('word_base.word_id'), nullable=False)
-    translation_id = Column(UUID(as_uuid=True), ForeignKey('translation.translation_id'), nullable=False)
-    added_at = Column(TIMESTAMP, default=datetime.utcnow)
+    # null while the translation is pending, see api/actions/translation_queue.py
+    translation_id = Column(UUID(as_uuid=True), ForeignKey('translation.translation_id'), nullable=True)
+    # ready | pending | failed
+    translation_status = Column(String, nullable=False, default="ready", server_default="ready")
+    # lease of a pending bundle by one process' translation queue, null when nobody holds it
+    claimed_until = Column(TIMESTAMP, nullable=True)
+    added_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow,
+                      server_default=text("timezone('utc', now())"))
     is_favorite = Column(Boolean(), default=False)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # spaced repetition (SM-2) state, see WordDAL.grade_review
+    ease = Column(Float, nullable=False, default=2.5, server_default="2.5")
+    interval_days = Column(Integer, nullable=False, default=0, server_default="0")
+    repetitions = Column(Integer, nullable=False, default=0, server_default="0")
+    due_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow,
+                    server_default=text("timezone('utc', now())"))
 
     __table_args__ = (
         UniqueConstraint('user_id', 'word_id', 'translation_id', name='uq_user_and_word_and_translation_id'),
+        Index('ix_user_words_user_id_due_at', 'user_id', 'due_at'),
+        Index('ix_user_words_user_id_added_at', 'user_id', 'added_at', 'bundle_id'),
+        Index('ix_user_words_user_id_is_favorite_added_at', 'user_id', 'is_favorite', 'added_at', 'bundle_id'),
+        Index('ix_user_words_user_id_version', 'user_id', 'version'),
+        # one pending bundle per user and word
+        Index('uq_user_words_pending', 'user_id', 'word_id', unique=True,
+              postgresql_where=text("translation_id IS NULL")),
+        Index('ix_user_words_translation_status', 'translation_status',
+              postgresql_where=text("translation_status = 'pending'")),
+    )
+
+
+class UserWordsTombstone(Base):
+    """Deleted bundles, returned by the delta sync of /user/my-words"""
+    __tablename__ = "user_words_tombstone"
+
+    bundle_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id'), nullable=False)
+    word_id = Column(UUID(as_uuid=True), nullable=False)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_words_tombstone_user_id_version', 'user_id', 'version'),
     )
@@ -1,9 +1,16 @@
-from typing import Generator
-from contextlib import asynccontextmanager
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Generator, Iterator, List, Union
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+import metrics
 import settings
 
 ##############################################
@@ -18,10 +25,136 @@ engine = create_async_engine(
     execution_options={"isolation_level": "AUTOCOMMIT"},
 )
 
+# the engine runs in autocommit mode, sessions which need several statements
+# to be atomic request a real transaction on their connection with these options
+ATOMIC = {"isolation_level": "READ COMMITTED"}
+
 # create session for the interaction with database
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
+# optional read replica with its own pool, used by read-only dependencies
+replica_engine = create_async_engine(
+    settings.REPLICA_DATABASE_URL,
+    future=True,
+    pool_size=settings.REPLICA_POOL_SIZE,
+    connect_args={"timeout": settings.REPLICA_CONNECT_TIMEOUT},
+    execution_options={"isolation_level": "AUTOCOMMIT"},
+) if settings.REPLICA_DATABASE_URL else None
+
+async_replica_session = sessionmaker(
+    replica_engine, expire_on_commit=False, class_=AsyncSession
+) if replica_engine is not None else None
+
+# monotonic time until which reads go to the primary after the replica failed
+_replica_down_until = 0.0
+
+
+class QueryStats:
+    """SQL statements executed while handling one request or inside count_queries()"""
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Union[List[str], None] = [] if keep_statements else None
+
+    def add(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+# set for every request by the metrics middleware in main.py
+request_query_stats: ContextVar[Union[QueryStats, None]] = ContextVar("request_query_stats", default=None)
+
+# active count_queries() blocks, they see statements from every task and thread
+_query_counters: List[QueryStats] = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_start_time
+    metrics.db_query_duration.observe(duration)
+    stats = request_query_stats.get()
+    if stats is not None:
+        stats.add(statement, duration)
+    for counter in _query_counters:
+        counter.add(statement, duration)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Counts the statements executed by the app while the block runs"""
+    counter = QueryStats(keep_statements=True)
+    _query_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _query_counters.remove(counter)
+
+
+@contextmanager
+def query_budget(max_queries: int, exact: bool = False) -> Iterator[QueryStats]:
+    """Fails the test when the block runs more statements than allowed.
+
+        with query_budget(2, exact=True):
+            client.get("/user/my-words", headers=auth_headers)
+
+    Works with TestClient too, the app runs in another thread there. Nothing
+    else should talk to the database while the block runs.
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries or (exact and counter.count != max_queries):
+        expected = "exactly" if exact else "at most"
+        raise AssertionError(
+            f"Expected {expected} {max_queries} queries, got {counter.count}:\n" + "\n".join(counter.statements)
+        )
+
+
+def instrument_engine(async_engine):
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+instrument_engine(engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+
+
+async def warm_up(async_engine, connections: int):
+    """Opens `connections` pool connections concurrently, so first requests do not pay for the handshakes"""
+    async def open_connection():
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(open_connection() for _ in range(connections)))
+
+
+async def ping(timeout: float = 2.0) -> bool:
+    """True when the primary answers a SELECT 1 within the timeout"""
+    async def select_one():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    try:
+        await asyncio.wait_for(select_one(), timeout)
+        return True
+    except (DBAPIError, OSError, asyncio.TimeoutError):
+        return False
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
 async def get_db() -> Generator:
     """Dependency for getting async session"""
     try:
@@ -31,6 +164,53 @@ async def get_db() -> Generator:
         await session.close()
 
 
+async def get_read_db(db_session: AsyncSession = Depends(get_db)) -> Generator:
+    """Dependency for getting async session for read-only queries.
+
+    Goes to the replica when it is configured and up. Otherwise it is the
+    request's primary session from get_db, so a request that reads and
+    writes holds one connection, not two.
+    """
+    if not _replica_up():
+        yield db_session
+        return
+    async with read_session() as session:
+        yield session
+
+
+def _replica_up() -> bool:
+    return async_replica_session is not None and time.monotonic() >= _replica_down_until
+
+
+def _is_connection_error(err: BaseException) -> bool:
+    if isinstance(err, DBAPIError):
+        return err.connection_invalidated or isinstance(err.orig, (OSError, asyncio.TimeoutError))
+    return isinstance(err, (OSError, asyncio.TimeoutError))
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """Read-only session on the replica, or on the primary when the replica is down.
+
+    For code that outlives a request, such as streamed responses; handlers use get_read_db.
+    Like any session it connects on the first query. When the replica can not
+    be reached that query fails and reads go to the primary for
+    REPLICA_RETRY_AFTER seconds.
+    """
+    global _replica_down_until
+    on_replica = _replica_up()
+    session = async_replica_session() if on_replica else async_session()
+    try:
+        yield session
+    except Exception as err:
+        if on_replica and _is_connection_error(err):
+            _replica_down_until = time.monotonic() + settings.REPLICA_RETRY_AFTER
+            print("Реплика недоступна, чтение идёт в основную базу:", repr(err))
+        raise
+    finally:
+        await session.close()
+
+
 from contextlib import asynccontextmanager
 
 
@@ -0,0 +1,31 @@
+import asyncio
+
+import settings
+from db.dals import TokenDAL
+from db.session import async_session
+
+
+async def delete_expired_tokens(batch_size: int = settings.TOKEN_SWEEP_BATCH_SIZE) -> int:
+    """Deletes all expired refresh tokens in batches, each batch is its own short statement"""
+    total = 0
+    while True:
+        async with async_session() as session:
+            async with session.begin():
+                deleted = await TokenDAL(session).delete_expired_tokens(batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+        # let the request handlers run between batches
+        await asyncio.sleep(0)
+
+
+async def sweep_expired_tokens(interval: int = settings.TOKEN_SWEEP_INTERVAL):
+    """Background task, runs until cancelled"""
+    while True:
+        try:
+            deleted = await delete_expired_tokens()
+            if deleted:
+                print("Удалено просроченных refresh токенов:", deleted)
+        except Exception as error:
+            print("Ошибка при удалении просроченных refresh токенов:", repr(error))
+        await asyncio.sleep(interval)
@@ -5,7 +5,33 @@ document.addEventListener('DOMContentLoaded', async () => {
   const partOfSpeechFilter = document.getElementById('partOfSpeechFilter');
   const dateFilter = document.getElementById('dateFilter'); // Добавлено
 
-  async function fetchWords() {
+  const loadMoreButton = document.getElementById('loadMore');
+  let nextCursor = null;
+
+  function buildWordsUrl(cursor) {
+    const params = new URLSearchParams();
+    params.append('sort', document.querySelector('input[name="sortOrder"]:checked').value);
+    if (favoritesOnlyCheckbox.checked) {
+      params.append('is_favorite', 'true');
+    }
+    if (partOfSpeechFilter.value) {
+      params.append('pos', partOfSpeechFilter.value);
+    }
+    if (dateFilter.value) {
+      // added_at хранится в UTC без часового пояса
+      const from = new Date(dateFilter.value + 'T00:00:00Z');
+      const to = new Date(from.getTime() + 24 * 60 * 60 * 1000);
+      params.append('added_from', from.toISOString().slice(0, 19));
+      params.append('added_to', to.toISOString().slice(0, 19));
+    }
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
+    return 'http://127.0.0.1:8000/user/my-words?' + params.toString();
+  }
+
+  // Фильтрация, сортировка и постраничная загрузка выполняются на сервере
+  async function fetchWords(append = false) {
     const token = await getToken();
 
     if (!token) {
@@ -14,7 +40,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
     try {
-      const response = await fetch('http://127.0.0.1:8000/user/my-words', {
+      const response = await fetch(buildWordsUrl(append ? nextCursor : null), {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${token}`,
@@ -26,51 +52,40 @@ document.addEventListener('DOMContentLoaded', async () => {
         throw new Error('Ошибка при выполнении запроса: ' + response.statusText);
       }
 
-      const words = await response.json();
-      if (!Array.isArray(words)) {
+      const page = await response.json();
+      if (!Array.isArray(page.items)) {
         throw new Error('Некорректный формат данных');
       }
-      renderWords(words);
+      nextCursor = page.next_cursor;
+      loadMoreButton.style.display = nextCursor ? '' : 'none';
+      renderWords(page.items, append);
     } catch (error) {
       wordList.innerHTML = `<p>Произошла ошибка: ${error.message}</p>`;
     }
   }
 
-  function renderWords(words) {
-    const favoritesOnly = favoritesOnlyCheckbox.checked;
-    const sortOrder = document.querySelector('input[name="sortOrder"]:checked').value;
-    const partOfSpeech = partOfSpeechFilter.value;
-    const selectedDate = dateFilter.value; // Добавлено
-
-    let filteredWords = words
-      .filter(word => !favoritesOnly || word.is_favorite)
-      .filter(word => !partOfSpeech || word.part_of_speech === partOfSpeech)
-      .filter(word => !selectedDate || new Date(word.added_at).toISOString().split('T')[0] === selectedDate); // Добавлено
-
-    if (sortOrder === 'time') {
-      filteredWords = filteredWords.sort((a, b) => new Date(b.added_at) - new Date(a.added_at));
-    } else if (sortOrder === 'alphabet') {
-      filteredWords = filteredWords.sort((a, b) => a.word.localeCompare(b.word));
+  function renderWords(words, append) {
+    if (!append) {
+      wordList.innerHTML = '';
     }
 
-    wordList.innerHTML = '';
-
-    filteredWords.forEach(word => {
+    words.forEach(word => {
       const wordItem = document.createElement('div');
       wordItem.className = `word-item${word.is_favorite ? ' favorite' : ''}`;
 
+      const translation = {
+        pending: 'перевод загружается…',
+        failed: 'не удалось перевести',
+      }[word.translation_status] || word.translation;
+
       wordItem.innerHTML = `
         <div class="word">${word.word}</div>
-        <div class="translation">${word.translation}</div>
+        <div class="translation">${translation}</div>
         <div class="part-of-speech">${word.part_of_speech}</div>
         <button class="edit-btn" data-id="${word.word_id}">Изменить перевод</button>
       `;
 
-      wordList.appendChild(wordItem);
-    });
-
-    document.querySelectorAll('.edit-btn').forEach(button => {
-      button.addEventListener('click', event => {
+      wordItem.querySelector('.edit-btn').addEventListener('click', event => {
         const wordId = event.target.getAttribute('data-id');
         const newTranslation = prompt('Введите новый перевод:');
         const newPos = prompt('Введите новую часть речи:');
@@ -78,6 +93,8 @@ document.addEventListener('DOMContentLoaded', async () => {
           updateWord(wordId, newTranslation, newPos);
         }
       });
+
+      wordList.appendChild(wordItem);
     });
   }
 
@@ -121,10 +138,11 @@ document.addEventListener('DOMContentLoaded', async () => {
     });
   }
 
-  favoritesOnlyCheckbox.addEventListener('change', fetchWords);
-  sortOrderRadios.forEach(radio => radio.addEventListener('change', fetchWords));
-  partOfSpeechFilter.addEventListener('change', fetchWords);
-  dateFilter.addEventListener('change', fetchWords); // Добавлено
+  favoritesOnlyCheckbox.addEventListener('change', () => fetchWords());
+  sortOrderRadios.forEach(radio => radio.addEventListener('change', () => fetchWords()));
+  partOfSpeechFilter.addEventListener('change', () => fetchWords());
+  dateFilter.addEventListener('change', () => fetchWords()); // Добавлено
+  loadMoreButton.addEventListener('click', () => fetchWords(true));
 
   fetchWords();
 });
@@ -1,6 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Union
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import metrics
+import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# set by the app lifespan, see main.py; without it (scripts, bench) the hashes
+# run in the loop's default executor
+_executor: Union[ThreadPoolExecutor, None] = None
+
+_timed_verify_and_update = metrics.timed(metrics.hashing_duration, pwd_context.verify_and_update, operation="verify")
+_timed_hash = metrics.timed(metrics.hashing_duration, pwd_context.hash, operation="hash")
+
+
+def create_executor() -> ThreadPoolExecutor:
+    """bcrypt releases the GIL, so a small thread pool is enough; its size caps
+    how many hashes run at once, the rest wait in the executor queue"""
+    return ThreadPoolExecutor(max_workers=settings.HASHING_WORKERS, thread_name_prefix="bcrypt")
+
+
+def use_executor(executor: Union[ThreadPoolExecutor, None]):
+    global _executor
+    _executor = executor
+
+
+async def _run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
 
 
 class Hasher:
@@ -10,4 +44,13 @@ class Hasher:
 
     @staticmethod
     def get_password_hash(password: str) -> str:
-        return pwd_context.hash(password)
\ No newline at end of file
+        return pwd_context.hash(password)
+
+    @staticmethod
+    async def async_verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Union[str, None]]:
+        """Returns (is valid, new hash if the stored one does not match the current policy)"""
+        return await _run_in_executor(_timed_verify_and_update, plain_password, hashed_password)
+
+    @staticmethod
+    async def async_get_password_hash(password: str) -> str:
+        return await _run_in_executor(_timed_hash, password)
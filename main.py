@@ -1,12 +1,84 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import math
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.routing import APIRouter
+from sqlalchemy.exc import DBAPIError
+from starlette.routing import Match
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
+import metrics
+import settings
+from api.actions.auth import _decode_access_token
+from api.actions.translation_queue import translation_queue
+from api.actions.translator import translator_client
+from api.actions.word import get_morph_analyzer
 from api.handlers import user_router
 from api.login_handler import login_router
+from db.dals import WordDAL
+from db.session import async_session, ATOMIC, QueryStats, request_query_stats
+from db.session import engine, replica_engine, warm_up, ping, dispose_engines
+from db.sweeper import sweep_expired_tokens
+import hashing
+from rate_limit import limiter
+from vocabulary_work.prefix_index import word_index
+from vocabulary_work.service import get_offline_dictionary, close_offline_dictionary
+
+
+async def load_word_index():
+    async with async_session() as session:
+        async with session.begin():
+            await session.connection(execution_options=ATOMIC)
+            words = [word async for words in WordDAL(session).stream_words(10000) for word in words]
+    word_index.load(words)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Builds every shared resource before the first request and releases them on shutdown.
+
+    /health/ready answers 200 only after the warm-up, so a rolling deploy
+    does not route users to a worker that would build them on their requests.
+    """
+    app.state.ready = False
+    await warm_up(engine, settings.DB_WARMUP_CONNECTIONS)
+    if replica_engine is not None:
+        try:
+            await warm_up(replica_engine, settings.DB_WARMUP_CONNECTIONS)
+        except (DBAPIError, OSError, asyncio.TimeoutError) as err:
+            # reads fall back to the primary, see db.session.read_session
+            print("Не удалось прогреть реплику:", repr(err))
+    await asyncio.to_thread(get_morph_analyzer)
+    get_offline_dictionary()
+    await load_word_index()
+    translator_client.client  # creates the connection pool
+    app.state.hashing_executor = hashing.create_executor()
+    hashing.use_executor(app.state.hashing_executor)
+    await translation_queue.start()  # also requeues the bundles left pending by a restart
+    token_sweeper = asyncio.create_task(sweep_expired_tokens())
+    app.state.ready = True
 
-app = FastAPI(title="fromboo")
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        token_sweeper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await token_sweeper
+        await translation_queue.stop()
+        await translator_client.aclose()
+        await dispose_engines()
+        hashing.use_executor(None)
+        # lets the running hashes finish without blocking the loop
+        await asyncio.to_thread(app.state.hashing_executor.shutdown, wait=True)
+        close_offline_dictionary()
+
+
+app = FastAPI(title="fromboo", lifespan=lifespan)
 main_api_router = APIRouter()
 
 main_api_router.include_router(user_router, prefix="/user")
@@ -22,14 +94,102 @@ origins = [
     "chrome-extension://gnkoiigiddipdiienojahafkapllelcp"
 ]
 
+
+def _route_path(request: Request) -> str:
+    """Path template of the matching route, keeps the metric labels bounded"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+# not limited: scraped and probed by the infrastructure
+RATE_LIMIT_EXEMPT = ("/metrics", "/health/live", "/health/ready")
+
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    """Per-ip and, for requests with a valid access token, per-user token buckets"""
+    if request.url.path in RATE_LIMIT_EXEMPT or request.method == "OPTIONS":
+        return await call_next(request)
+    ip = request.client.host if request.client else "unknown"
+    retry_after = await limiter.hit("ip", ip, settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST)
+    authorization = request.headers.get("authorization", "")
+    if not retry_after and authorization.lower().startswith("bearer "):
+        try:
+            user_id = _decode_access_token(authorization[7:])
+        except HTTPException:
+            user_id = None
+        if user_id:
+            retry_after = await limiter.hit(
+                "user", user_id, settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_BURST
+            )
+    if retry_after:
+        return JSONResponse(
+            {"detail": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def collect_metrics(request: Request, call_next):
+    route = _route_path(request)
+    query_stats = QueryStats()
+    request_query_stats.set(query_stats)
+    metrics.http_requests_in_flight.inc(method=request.method, route=route)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        if settings.DEBUG:
+            response.headers["X-DB-Query-Count"] = str(query_stats.count)
+            response.headers["X-DB-Query-Time"] = f"{query_stats.duration * 1000:.2f}ms"
+        return response
+    finally:
+        metrics.http_requests_in_flight.dec(method=request.method, route=route)
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start, method=request.method, route=route, status=status_code
+        )
+        metrics.db_queries.inc(query_stats.count, route=route)
+        metrics.db_queries_per_request.observe(query_stats.count, route=route)
+        metrics.db_time_per_request.observe(query_stats.duration, route=route)
+
+
+# added last, so it is the outermost middleware and 429s get the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Access-Control-Allow-Origin"]
+    expose_headers=["Access-Control-Allow-Origin", "Retry-After"]
 )
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live")
+async def health_live():
+    """The process is up and serving, says nothing about its dependencies"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once the lifespan warm-up is done and while the database answers, 503 otherwise"""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    if not await ping():
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ok"}
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
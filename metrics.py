@@ -0,0 +1,199 @@
+"""In-process metrics in the Prometheus text format, served by /metrics"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in list(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for key, state in list(self._values.items()):
+            for bound, count in zip(self.buckets, state):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._caches: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, cache):
+        """Cache with a stats() method (cache.LRUCache), reported on every scrape"""
+        self._caches[name] = cache
+
+    def _cache_metrics(self) -> List[str]:
+        metrics = (
+            ("cache_size", "gauge", "Number of cached entries", "size"),
+            ("cache_hits_total", "counter", "Cache hits", "hits"),
+            ("cache_misses_total", "counter", "Cache misses", "misses"),
+            ("cache_hit_ratio", "gauge", "Cache hits / lookups", "hit_rate"),
+        )
+        stats = {name: cache.stats() for name, cache in self._caches.items()}
+        lines = []
+        for metric, metric_type, documentation, stat in metrics:
+            lines.append(f"# HELP {metric} {documentation}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            lines.extend(f'{metric}{{cache="{name}"}} {values[stat]}' for name, values in stats.items())
+        return lines
+
+    def render(self) -> str:
+        lines = [line for metric in self._metrics for line in metric.collect()]
+        lines.extend(self._cache_metrics())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"),
+))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests being handled right now", ("method", "route"),
+))
+db_queries = REGISTRY.register(Counter(
+    "db_queries_total", "SQL statements executed", ("route",),
+))
+db_query_duration = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Duration of one SQL statement",
+))
+db_queries_per_request = REGISTRY.register(Histogram(
+    "db_queries_per_request", "SQL statements per request", ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100),
+))
+db_time_per_request = REGISTRY.register(Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request", ("route",),
+))
+translator_request_duration = REGISTRY.register(Histogram(
+    "translator_request_duration_seconds", "Latency of one upstream translator request", ("status",),
+))
+translator_errors = REGISTRY.register(Counter(
+    "translator_errors_total", "Failed upstream translator requests", ("reason",),
+))
+translator_chars = REGISTRY.register(Counter(
+    "translator_chars_total", "Characters sent to the translator",
+))
+translator_coalesced = REGISTRY.register(Counter(
+    "translator_coalesced_total", "Translations served by an upstream call already in flight",
+))
+translator_circuit_open = REGISTRY.register(Gauge(
+    "translator_circuit_open", "1 while the translator circuit breaker is open or half-open",
+))
+translation_queue_size = REGISTRY.register(Gauge(
+    "translation_queue_size", "Pending bundles waiting for a translation worker",
+))
+translation_queue_processed = REGISTRY.register(Counter(
+    "translation_queue_processed_total", "Pending bundles handled by the translation workers", ("result",),
+))
+rate_limited = REGISTRY.register(Counter(
+    "rate_limited_total", "Calls rejected by a rate limit", ("scope",),
+))
+hashing_duration = REGISTRY.register(Histogram(
+    "hashing_duration_seconds", "bcrypt time", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5),
+))
+pos_tagging_duration = REGISTRY.register(Histogram(
+    "pos_tagging_duration_seconds", "pymorphy3 parse time of one string (memo misses only)",
+))
+
+
+def timed(histogram: Histogram, func: Callable, **labels) -> Callable:
+    """Wraps a sync function so every call is observed in the histogram"""
+    def wrapper(*args, **kwargs):
+        with histogram.time(**labels):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,38 @@
+"""added pending translation state to user_words
+
+Revision ID: 07133fbaf8a8
+Revises: 002fa7a3c15c
+Create Date: 2026-10-18 13:40:52.284117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '07133fbaf8a8'
+down_revision = '002fa7a3c15c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_words', sa.Column('translation_status', sa.String(), server_default='ready', nullable=False))
+    op.alter_column('user_words', 'translation_id',
+               existing_type=postgresql.UUID(),
+               nullable=True)
+    op.create_index('uq_user_words_pending', 'user_words', ['user_id', 'word_id'], unique=True,
+                    postgresql_where=sa.text('translation_id IS NULL'))
+    op.create_index('ix_user_words_translation_status', 'user_words', ['translation_status'],
+                    postgresql_where=sa.text("translation_status = 'pending'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_words_translation_status', table_name='user_words')
+    op.drop_index('uq_user_words_pending', table_name='user_words')
+    op.execute("DELETE FROM user_words WHERE translation_id IS NULL")
+    op.alter_column('user_words', 'translation_id',
+               existing_type=postgresql.UUID(),
+               nullable=False)
+    op.drop_column('user_words', 'translation_status')
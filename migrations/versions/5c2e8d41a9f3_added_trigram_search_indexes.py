@@ -0,0 +1,29 @@
+"""added trigram search indexes
+
+Revision ID: 5c2e8d41a9f3
+Revises: 07133fbaf8a8
+Create Date: 2026-10-18 15:02:17.613904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8d41a9f3'
+down_revision = '07133fbaf8a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_word_base_word_trgm', 'word_base', ['word'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'word': 'gin_trgm_ops'})
+    op.create_index('ix_translation_translation_trgm', 'translation', ['translation'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'translation': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_translation_translation_trgm', table_name='translation')
+    op.drop_index('ix_word_base_word_trgm', table_name='word_base')
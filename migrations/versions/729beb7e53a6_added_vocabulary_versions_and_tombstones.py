@@ -0,0 +1,40 @@
+"""added vocabulary versions and tombstones
+
+Revision ID: 729beb7e53a6
+Revises: 9185dff8dada
+Create Date: 2026-10-18 10:03:27.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '729beb7e53a6'
+down_revision = '9185dff8dada'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('vocab_version', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('user_words', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_user_words_user_id_version', 'user_words', ['user_id', 'version'])
+    op.create_table('user_words_tombstone',
+    sa.Column('bundle_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('word_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.TIMESTAMP(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('bundle_id')
+    )
+    op.create_index('ix_user_words_tombstone_user_id_version', 'user_words_tombstone', ['user_id', 'version'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_words_tombstone_user_id_version', table_name='user_words_tombstone')
+    op.drop_table('user_words_tombstone')
+    op.drop_index('ix_user_words_user_id_version', table_name='user_words')
+    op.drop_column('user_words', 'version')
+    op.drop_column('users', 'vocab_version')
@@ -0,0 +1,27 @@
+"""made user_words.added_at not null
+
+Revision ID: 7f2b9d0c4e18
+Revises: a3d05f7e9c61
+Create Date: 2026-10-18 19:02:47.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2b9d0c4e18'
+down_revision = 'a3d05f7e9c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # rows saved without a time sort as the oldest ones, keyset cursors can not point at a null
+    op.execute("UPDATE user_words SET added_at = 'epoch' WHERE added_at IS NULL")
+    op.alter_column('user_words', 'added_at', existing_type=sa.TIMESTAMP(), nullable=False,
+                    server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    op.alter_column('user_words', 'added_at', existing_type=sa.TIMESTAMP(), nullable=True, server_default=None)
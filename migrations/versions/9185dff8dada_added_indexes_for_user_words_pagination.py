@@ -0,0 +1,27 @@
+"""added indexes for user_words pagination
+
+Revision ID: 9185dff8dada
+Revises: 445cfcb3c75c
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9185dff8dada'
+down_revision = '445cfcb3c75c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_words_user_id_added_at', 'user_words', ['user_id', 'added_at', 'bundle_id'])
+    op.create_index('ix_user_words_user_id_is_favorite_added_at', 'user_words',
+                    ['user_id', 'is_favorite', 'added_at', 'bundle_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_words_user_id_is_favorite_added_at', table_name='user_words')
+    op.drop_index('ix_user_words_user_id_added_at', table_name='user_words')
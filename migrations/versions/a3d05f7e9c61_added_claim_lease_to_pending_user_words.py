@@ -0,0 +1,24 @@
+"""added claim lease to pending user_words
+
+Revision ID: a3d05f7e9c61
+Revises: e4a7c9135b2d
+Create Date: 2026-10-18 18:40:33.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d05f7e9c61'
+down_revision = 'e4a7c9135b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_words', sa.Column('claimed_until', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user_words', 'claimed_until')
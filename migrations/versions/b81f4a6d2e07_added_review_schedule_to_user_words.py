@@ -0,0 +1,35 @@
+"""added review schedule to user_words
+
+Revision ID: b81f4a6d2e07
+Revises: 5c2e8d41a9f3
+Create Date: 2026-10-18 16:21:45.108327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f4a6d2e07'
+down_revision = '5c2e8d41a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_words', sa.Column('ease', sa.Float(), server_default='2.5', nullable=False))
+    op.add_column('user_words', sa.Column('interval_days', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user_words', sa.Column('repetitions', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user_words', sa.Column('due_at', sa.TIMESTAMP(),
+                                          server_default=sa.text("timezone('utc', now())"), nullable=False))
+    # words saved before are due right away, oldest first
+    op.execute("UPDATE user_words SET due_at = added_at WHERE added_at IS NOT NULL")
+    op.create_index('ix_user_words_user_id_due_at', 'user_words', ['user_id', 'due_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_words_user_id_due_at', table_name='user_words')
+    op.drop_column('user_words', 'due_at')
+    op.drop_column('user_words', 'repetitions')
+    op.drop_column('user_words', 'interval_days')
+    op.drop_column('user_words', 'ease')
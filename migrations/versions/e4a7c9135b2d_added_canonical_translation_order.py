@@ -0,0 +1,30 @@
+"""added canonical translation order
+
+Revision ID: e4a7c9135b2d
+Revises: b81f4a6d2e07
+Create Date: 2026-10-18 18:05:12.447019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c9135b2d'
+down_revision = 'b81f4a6d2e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('translation', sa.Column('is_custom', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.add_column('translation', sa.Column('created_at', sa.TIMESTAMP(),
+                                           server_default=sa.text("timezone('utc', now())"), nullable=False))
+    op.create_index('ix_translation_word_id_canonical', 'translation',
+                    ['word_id', 'is_custom', 'created_at', 'translation_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_translation_word_id_canonical', table_name='translation')
+    op.drop_column('translation', 'created_at')
+    op.drop_column('translation', 'is_custom')
@@ -0,0 +1,103 @@
+"""Token-bucket rate limiting.
+
+A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+second; a call takes `cost` tokens or is told how long to wait for them.
+Buckets live in a pluggable backend: MemoryBackend (per process, the
+default) or RedisBackend, shared by every worker and host. RedisBackend only
+needs a client with an async `eval`, so a local fake can stand in for it.
+"""
+import time
+from typing import Union
+
+import metrics
+import settings
+from cache import LRUCache
+
+# KEYS[1] bucket; ARGV capacity, rate, cost. Returns the seconds to wait, "0" when the tokens were taken
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+        # an evicted bucket comes back full, the lru keeps the active ones
+        self._buckets = LRUCache(maxsize=max_keys)
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets.set(key, (tokens, now))
+        return wait
+
+
+class RedisBackend:
+    def __init__(self, client, prefix: str = "rate_limit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package: pip install redis")
+        return cls(redis.from_url(url))
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1) -> float:
+        wait = await self.client.eval(TAKE_SCRIPT, 1, self.prefix + key, capacity, rate, cost)
+        return float(wait)
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(self, scope: str, key: str, per_minute: int, burst: int, cost: float = 1) -> float:
+        """Takes `cost` tokens from the scope:key bucket, returns 0 or the seconds to wait.
+
+        The limit is `per_minute` on average with bursts of up to `burst` calls.
+        A backend error lets the call through: the limiter must not take the api down.
+        """
+        if not settings.RATE_LIMIT_ENABLED or per_minute <= 0:
+            return 0.0
+        try:
+            wait = await self.backend.take(f"{scope}:{key}", burst, per_minute / 60, cost)
+        except Exception as error:
+            print("Ошибка лимитера запросов:", repr(error))
+            return 0.0
+        if wait:
+            metrics.rate_limited.inc(scope=scope)
+        return wait
+
+
+def _make_backend() -> Union[MemoryBackend, RedisBackend]:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend.from_url(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+
+limiter = RateLimiter(_make_backend())
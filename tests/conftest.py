@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# the project modules are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Points the app's sessions at TEST_DATABASE_URL with the rate limits off, for this test only.
+
+    The test is skipped when the database can not be reached.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import settings
+    from db import session as db_session
+    from db.models import Base
+
+    engine = create_async_engine(
+        settings.TEST_DATABASE_URL,
+        future=True,
+        execution_options={"isolation_level": "AUTOCOMMIT"},
+    )
+    db_session.instrument_engine(engine)
+
+    async def prepare_database():
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                await connection.run_sync(Base.metadata.create_all)
+        finally:
+            # pooled connections belong to this event loop, every test runs its own
+            await engine.dispose()
+
+    try:
+        asyncio.run(asyncio.wait_for(prepare_database(), timeout=10))
+    except (DBAPIError, OSError, asyncio.TimeoutError) as err:
+        pytest.skip(f"TEST_DATABASE_URL is not reachable: {err!r}")
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(db_session, "engine", engine)
+    monkeypatch.setattr(db_session, "async_session", sessionmaker(engine, expire_on_commit=False, class_=AsyncSession))
+    # reads go to the test database too
+    monkeypatch.setattr(db_session, "async_replica_session", None)
+    return engine
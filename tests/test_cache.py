@@ -0,0 +1,51 @@
+import cache
+from cache import LRUCache
+
+
+def test_get_returns_default_for_missing_keys():
+    lru = LRUCache(maxsize=2)
+    assert lru.get("missing") is None
+    assert lru.get("missing", 0) == 0
+
+
+def test_evicts_the_least_recently_used_key():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert len(lru) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(maxsize=10, ttl=5)
+    lru.set("a", 1)
+    now[0] += 4
+    assert lru.get("a") == 1
+    now[0] += 2
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_pop_and_clear():
+    lru = LRUCache()
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.pop("a") == 1
+    assert lru.pop("a", "gone") == "gone"
+    lru.clear()
+    assert len(lru) == 0
+
+
+def test_stats_count_hits_and_misses():
+    lru = LRUCache(maxsize=5)
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("b")
+    assert lru.stats() == {"size": 1, "maxsize": 5, "hits": 2, "misses": 1, "hit_rate": 2 / 3}
@@ -0,0 +1,69 @@
+from api.actions import translator
+from api.actions.translator import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_breaker(monkeypatch, failures=2, reset=30):
+    clock = Clock()
+    monkeypatch.setattr(translator.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=failures, reset_timeout=reset)
+    for _ in range(failures):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker, clock
+
+
+def test_opens_after_failures_in_a_row(monkeypatch):
+    breaker, _ = open_breaker(monkeypatch)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_lets_one_probe_through_after_the_reset_timeout(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_again(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_released_probe_can_be_retried(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
@@ -0,0 +1,48 @@
+import pytest
+
+import settings
+from vocabulary_work.importer import InvalidImportFile, parse, parse_csv, parse_ndjson
+
+
+def test_csv_skips_the_header_and_cleans_values():
+    rows = parse_csv("word,translation,pos\n  Ice   Cream ,Мороженое,NOUN\n")
+    assert rows == [("ice cream", "мороженое", "NOUN")]
+
+
+def test_csv_header_is_only_skipped_on_the_first_row():
+    rows = parse_csv("cat,кот\nword,слово\n")
+    assert rows == [("cat", "кот", None), ("word", "слово", None)]
+
+
+def test_csv_pads_short_rows_and_skips_blank_lines():
+    rows = parse_csv("cat\n\ndog,\n")
+    assert rows == [("cat", None, None), ("dog", None, None)]
+
+
+def test_ndjson_reads_both_pos_keys():
+    rows = parse_ndjson(
+        '{"word": "Cat", "translation": "кот", "pos": "NOUN"}\n'
+        '\n'
+        '{"word": "run", "part_of_speech": "VERB"}\n'
+    )
+    assert rows == [("cat", "кот", "NOUN"), ("run", None, "VERB")]
+
+
+def test_ndjson_reports_the_invalid_line():
+    with pytest.raises(InvalidImportFile, match="line 2"):
+        parse_ndjson('{"word": "cat"}\n{"word": \n')
+
+
+def test_ndjson_rejects_lines_that_are_not_objects():
+    with pytest.raises(InvalidImportFile, match="Line 1"):
+        parse_ndjson('["cat", "кот"]\n')
+
+
+def test_parse_drops_rows_without_a_word():
+    assert parse(",кот\ndog,собака\n", "csv") == [("dog", "собака", None)]
+
+
+def test_parse_caps_the_number_of_rows(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_ROWS", 2)
+    with pytest.raises(InvalidImportFile, match="Too many rows"):
+        parse("a\nb\nc\n", "csv")
@@ -0,0 +1,51 @@
+import pytest
+
+from vocabulary_work.service import OfflineDictionary, build_index, read_tsv
+
+
+def test_lookup_finds_every_word(tmp_path):
+    path = str(tmp_path / "en_ru.idx")
+    assert build_index([("cat", "кошка"), ("Dog", "Собака"), ("apple", "яблоко")], path) == 3
+    dictionary = OfflineDictionary(path)
+    try:
+        assert len(dictionary) == 3
+        assert dictionary.lookup("cat") == "кошка"
+        assert dictionary.lookup(" DOG ") == "собака"
+        assert dictionary.lookup("apple") == "яблоко"
+        assert dictionary.lookup("banana") is None
+        assert dictionary.lookup("") is None
+    finally:
+        dictionary.close()
+
+
+def test_first_translation_of_a_word_wins(tmp_path):
+    path = str(tmp_path / "en_ru.idx")
+    assert build_index([("run", "бежать"), ("run", "запускать"), ("", "пусто")], path) == 1
+    dictionary = OfflineDictionary(path)
+    try:
+        assert dictionary.lookup("run") == "бежать"
+    finally:
+        dictionary.close()
+
+
+def test_empty_index(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    build_index([], path)
+    dictionary = OfflineDictionary(path)
+    try:
+        assert dictionary.lookup("cat") is None
+    finally:
+        dictionary.close()
+
+
+def test_rejects_files_that_are_not_an_index(tmp_path):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(b"not a dictionary index at all")
+    with pytest.raises(ValueError):
+        OfflineDictionary(str(path))
+
+
+def test_read_tsv_skips_lines_without_a_translation(tmp_path):
+    path = tmp_path / "en_ru.tsv"
+    path.write_text("cat\tкошка\nbroken line\ndog\tсобака\textra\n", encoding="utf-8")
+    assert list(read_tsv(str(path))) == [("cat", "кошка"), ("dog", "собака")]
@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from api.actions.pagination import decode_cursor, encode_cursor, naive_utc, vocabulary_etag
+
+
+def test_time_cursor_round_trip():
+    bundle_id = uuid.uuid4()
+    added_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(added_at, bundle_id), "time") == (added_at, bundle_id)
+
+
+def test_alphabet_cursor_round_trip():
+    bundle_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor("кошка", bundle_id), "alphabet") == ("кошка", bundle_id)
+
+
+@pytest.mark.parametrize("cursor", ["not base64 at all!", encode_cursor("word", "not-a-uuid"), ""])
+def test_invalid_cursor_is_a_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "time")
+    assert error.value.status_code == 400
+
+
+def test_naive_utc():
+    moscow = timezone(timedelta(hours=3))
+    assert naive_utc(datetime(2024, 1, 1, 15, 0, tzinfo=moscow)) == datetime(2024, 1, 1, 12, 0)
+    assert naive_utc(datetime(2024, 1, 1, 15, 0)) == datetime(2024, 1, 1, 15, 0)
+    assert naive_utc(None) is None
+
+
+def test_etag_changes_with_the_version_and_the_query():
+    user_id = uuid.uuid4()
+    etag = vocabulary_etag(user_id, 5, "limit=100")
+    assert etag == vocabulary_etag(user_id, 5, "limit=100")
+    assert etag.startswith('W/"5-')
+    assert etag != vocabulary_etag(user_id, 6, "limit=100")
+    assert etag != vocabulary_etag(user_id, 5, "limit=50")
+    assert etag != vocabulary_etag(uuid.uuid4(), 5, "limit=100")
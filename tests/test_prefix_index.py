@@ -0,0 +1,43 @@
+from vocabulary_work.prefix_index import PrefixIndex
+
+
+def make_index(*words):
+    index = PrefixIndex()
+    index.load(words)
+    return index
+
+
+def test_completes_a_prefix_in_order():
+    index = make_index("icy", "ice", "apple", "iceberg", "ice cream")
+    assert index.complete("ic") == ["ice", "ice cream", "iceberg", "icy"]
+    assert index.complete("ice ") == ["ice cream"]
+    assert index.complete("z") == []
+
+
+def test_limits_the_completions():
+    index = make_index("a", "ab", "abc", "abcd")
+    assert index.complete("a", limit=2) == ["a", "ab"]
+
+
+def test_load_drops_duplicates_and_marks_ready():
+    index = PrefixIndex()
+    assert not index.ready
+    index.load(["b", "a", "b"])
+    assert index.ready
+    assert len(index) == 2
+
+
+def test_add_keeps_the_words_sorted_and_unique():
+    index = make_index("b", "d")
+    index.add("c")
+    index.add("c")
+    index.add("")
+    assert index.complete("") == ["b", "c", "d"]
+    assert "c" in index
+    assert "a" not in index
+
+
+def test_add_many_merges_a_batch():
+    index = make_index("b", "d")
+    index.add_many(["e", "a", "d", "c", "a"])
+    assert index.complete("", limit=10) == ["a", "b", "c", "d", "e"]
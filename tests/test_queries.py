@@ -0,0 +1,69 @@
+"""Query budgets of the hot endpoints, run against TEST_DATABASE_URL (see the engine fixture)"""
+import asyncio
+import uuid
+
+import httpx
+
+from db.dals import WordDAL
+from db.session import query_budget
+from main import app
+
+PASSWORD = "test-password"
+
+
+async def login(client: httpx.AsyncClient) -> dict:
+    email = f"queries-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post("/user/", json={"name": "queries", "email": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    response = await client.post("/login/token", data={"username": email, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def run(engine, scenario):
+    async def wrapper():
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await scenario(client)
+        finally:
+            await engine.dispose()
+    asyncio.run(wrapper())
+
+
+def test_my_words_runs_exactly_two_queries(engine):
+    async def scenario(client):
+        headers = await login(client)
+        # puts the user into the auth cache, as on every request after the first one
+        assert (await client.get("/user/get-user", headers=headers)).status_code == 200
+        with query_budget(2, exact=True):
+            response = await client.get("/user/my-words", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["items"] == []
+
+    run(engine, scenario)
+
+
+def test_not_modified_my_words_runs_one_query(engine):
+    async def scenario(client):
+        headers = await login(client)
+        etag = (await client.get("/user/my-words", headers=headers)).headers["etag"]
+        with query_budget(1, exact=True):
+            response = await client.get("/user/my-words", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+
+    run(engine, scenario)
+
+
+def test_search_matches_are_read_from_the_trigram_indexes(engine):
+    async def scenario(client):
+        stmt = WordDAL._search_select(uuid.uuid4(), "word", limit=10, offset=0)
+        async with engine.connect() as connection:
+            # the tables of a test database are tiny, a seq scan would always win on cost
+            await connection.exec_driver_sql("SET enable_seqscan = off")
+            sql = str(stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+            plan = "\n".join(row[0] for row in await connection.exec_driver_sql("EXPLAIN " + sql))
+        assert "ix_word_base_word_trgm" in plan, plan
+        assert "ix_translation_translation_trgm" in plan, plan
+
+    run(engine, scenario)
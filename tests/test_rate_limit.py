@@ -0,0 +1,125 @@
+import asyncio
+
+import httpx
+
+import rate_limit
+import settings
+from rate_limit import MemoryBackend, RateLimiter, RedisBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Records eval calls and answers with the queued results"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append((script, numkeys, args))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_memory_backend_takes_tokens_until_the_bucket_is_empty(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "monotonic", Clock())
+    backend = MemoryBackend()
+
+    async def take():
+        return [await backend.take("user:1", capacity=2, rate=1) for _ in range(3)]
+
+    assert asyncio.run(take()) == [0.0, 0.0, 1.0]
+
+
+def test_memory_backend_refills_with_time(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    backend = MemoryBackend()
+
+    async def scenario():
+        await backend.take("ip:1", capacity=2, rate=1)
+        await backend.take("ip:1", capacity=2, rate=1)
+        clock.now += 0.5
+        half_refilled = await backend.take("ip:1", capacity=2, rate=1)
+        clock.now += 10
+        # the bucket never holds more than its capacity
+        refilled = [await backend.take("ip:1", capacity=2, rate=1) for _ in range(3)]
+        return half_refilled, refilled
+
+    half_refilled, refilled = asyncio.run(scenario())
+    assert half_refilled == 0.5
+    assert refilled == [0.0, 0.0, 1.0]
+
+
+def test_memory_backend_keeps_buckets_apart(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "monotonic", Clock())
+    backend = MemoryBackend()
+
+    async def scenario():
+        await backend.take("user:1", capacity=1, rate=1)
+        return await backend.take("user:1", capacity=1, rate=1), await backend.take("user:2", capacity=1, rate=1)
+
+    assert asyncio.run(scenario()) == (1.0, 0.0)
+
+
+def test_redis_backend_runs_the_script_on_the_prefixed_key():
+    client = FakeRedis(b"0", b"2.5")
+    backend = RedisBackend(client)
+
+    async def scenario():
+        return await backend.take("user:1", 30, 2.0), await backend.take("user:1", 30, 2.0, cost=3)
+
+    assert asyncio.run(scenario()) == (0.0, 2.5)
+    script, numkeys, args = client.calls[1]
+    assert script == rate_limit.TAKE_SCRIPT
+    assert numkeys == 1
+    assert args == ("rate_limit:user:1", 30, 2.0, 3)
+
+
+def test_limiter_converts_per_minute_limits(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    client = FakeRedis("0")
+    asyncio.run(RateLimiter(RedisBackend(client)).hit("user", "1", per_minute=120, burst=30))
+    assert client.calls[0][2] == ("rate_limit:user:1", 30, 2.0, 1)
+
+
+def test_limiter_fails_open_when_the_backend_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter(RedisBackend(FakeRedis(ConnectionError("redis is down"))))
+    assert asyncio.run(limiter.hit("user", "1", per_minute=60, burst=1)) == 0.0
+
+
+def test_limiter_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    client = FakeRedis()
+    assert asyncio.run(RateLimiter(RedisBackend(client)).hit("user", "1", per_minute=1, burst=1)) == 0.0
+    assert client.calls == []
+
+
+def test_middleware_answers_429_with_retry_after(monkeypatch):
+    import main
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_PER_MINUTE", 60)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 2)
+    monkeypatch.setattr(main.limiter, "backend", MemoryBackend())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # no token: rejected by the auth dependency without touching the database
+            return [await client.get("/user/get-user") for _ in range(3)]
+
+    first, second, third = asyncio.run(scenario())
+    assert first.status_code == second.status_code == 401
+    assert third.status_code == 429
+    assert third.headers["retry-after"] == "1"
@@ -0,0 +1,39 @@
+"""Concurrent saves of one word, run against TEST_DATABASE_URL (see the engine fixture)"""
+import asyncio
+import uuid
+from datetime import datetime
+
+from db import session as db_session
+from db.dals import UserDAL, WordDAL
+
+
+def test_concurrent_saves_of_a_word_leave_one_bundle(engine):
+    word = f"race-{uuid.uuid4().hex[:8]}"
+
+    async def save(user_id):
+        async with db_session.async_session() as session:
+            async with session.begin():
+                await session.connection(execution_options=db_session.ATOMIC)
+                return await WordDAL(session).save_word_for_user(user_id, word, "гонка", "NOUN", datetime.utcnow())
+
+    async def scenario():
+        async with db_session.async_session() as session:
+            async with session.begin():
+                user = await UserDAL(session).create_user(
+                    name="race", email=f"race-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-",
+                )
+        # gather raises the first error of any save
+        saved = await asyncio.gather(*(save(user.user_id) for _ in range(10)))
+        assert len({bundle["bundle_id"] for bundle in saved}) == 1
+
+        async with db_session.async_session() as session:
+            async with session.begin():
+                rows = await WordDAL(session).get_user_words(user.user_id)
+        assert [row["word"] for row in rows] == [word]
+
+    async def wrapper():
+        try:
+            await scenario()
+        finally:
+            await engine.dispose()
+    asyncio.run(wrapper())
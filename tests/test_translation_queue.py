@@ -0,0 +1,101 @@
+"""Lease claiming and dedupe of the translation queue, run against TEST_DATABASE_URL (see the engine fixture)"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from api.actions import translation_queue as queue_module
+from api.actions.translation_queue import TranslationQueue
+from api.actions.word import WordService
+from db import session as db_session
+from db.dals import UserDAL, WordDAL
+
+LEASE = 60
+
+
+async def create_user() -> uuid.UUID:
+    async with db_session.async_session() as session:
+        async with session.begin():
+            user = await UserDAL(session).create_user(
+                name="queue", email=f"queue-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-",
+            )
+            return user.user_id
+
+
+async def save_pending(user_id: uuid.UUID, word: str, time: datetime) -> dict:
+    async with db_session.async_session() as session:
+        async with session.begin():
+            bundle, claimed = await WordDAL(session).save_pending_word_for_user(
+                user_id, word, time, time + timedelta(seconds=LEASE)
+            )
+    assert claimed
+    return bundle
+
+
+async def claim(now: datetime) -> list:
+    async with db_session.async_session() as session:
+        async with session.begin():
+            return await WordDAL(session).claim_pending_bundles(1000, now, now + timedelta(seconds=LEASE))
+
+
+async def user_bundles(user_id: uuid.UUID, word: str) -> list:
+    async with db_session.async_session() as session:
+        async with session.begin():
+            rows = await WordDAL(session).get_user_words(user_id)
+    return [row for row in rows if row["word"] == word]
+
+
+def run(engine, scenario):
+    async def wrapper():
+        try:
+            await scenario()
+        finally:
+            await engine.dispose()
+    asyncio.run(wrapper())
+
+
+def test_a_claimed_bundle_is_claimed_again_after_the_lease_runs_out(engine):
+    async def scenario():
+        user_id = await create_user()
+        word = f"lease-{uuid.uuid4().hex[:8]}"
+        saved_at = datetime(2000, 1, 1)
+        bundle = await save_pending(user_id, word, saved_at)
+        try:
+            # the lease of the saving process is still running
+            assert bundle["bundle_id"] not in [row[0] for row in await claim(saved_at)]
+            expired = saved_at + timedelta(seconds=LEASE + 1)
+            assert (bundle["bundle_id"], user_id, bundle["word_id"], word) in await claim(expired)
+        finally:
+            async with db_session.async_session() as session:
+                async with session.begin():
+                    await WordDAL(session).delete_bundle_by_id(user_id, bundle["bundle_id"])
+
+    run(engine, scenario)
+
+
+def test_two_workers_resolving_a_duplicate_leave_one_bundle(engine, monkeypatch):
+    monkeypatch.setattr(queue_module, "async_session", db_session.async_session)
+
+    async def lookup_translation(word, word_dal):
+        return "перевод", "NOUN"
+
+    monkeypatch.setattr(WordService, "lookup_translation", staticmethod(lookup_translation))
+
+    async def scenario():
+        user_id = await create_user()
+        word = f"dedupe-{uuid.uuid4().hex[:8]}"
+        async with db_session.async_session() as session:
+            async with session.begin():
+                await WordDAL(session).save_word_for_user(user_id, word, "перевод", "NOUN", datetime.utcnow())
+        # saved again while the translator was down: the translation comes out the same
+        bundle = await save_pending(user_id, word, datetime.utcnow())
+        pending = (bundle["bundle_id"], user_id, bundle["word_id"], word)
+
+        queue = TranslationQueue(workers=0)
+        await asyncio.gather(queue._process(pending, 0), queue._process(pending, 0))
+
+        bundles = await user_bundles(user_id, word)
+        assert len(bundles) == 1
+        assert bundles[0]["translation"] == "перевод"
+        assert bundles[0]["translation_status"] == "ready"
+
+    run(engine, scenario)
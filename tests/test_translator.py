@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+import settings
+from api.actions.translator import CircuitBreaker, TranslatorCircuitOpen, TranslatorClient, TranslatorUnavailable
+from rate_limit import limiter
+
+
+def translated(payload):
+    return httpx.Response(200, json=[{"translations": [{"text": "RU " + item["Text"]}]} for item in payload])
+
+
+def failed(payload):
+    return None
+
+
+def make_client(monkeypatch, *responses):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    client = TranslatorClient(batch_size=2, retries=0, breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+    responses = list(responses)
+
+    async def post(payload, params):
+        return responses.pop(0)(payload)
+
+    client._post = post
+    return client
+
+
+def test_a_failed_batch_keeps_the_others(monkeypatch):
+    client = make_client(monkeypatch, translated, failed, translated)
+    result = asyncio.run(client.translate_many(["a", "b", "c", "d", "e"]))
+    assert result == ["ru a", "ru b", None, None, "ru e"]
+
+
+def test_raises_when_no_batch_was_translated(monkeypatch):
+    client = make_client(monkeypatch, failed, failed)
+    with pytest.raises(TranslatorUnavailable):
+        asyncio.run(client.translate_many(["a", "b", "c"]))
+
+
+def test_an_open_breaker_does_not_spend_the_budget(monkeypatch):
+    client = make_client(monkeypatch)
+    for _ in range(client.breaker.failure_threshold):
+        client.breaker.record_failure()
+    hits = []
+
+    async def hit(*args):
+        hits.append(args)
+        return 0
+
+    monkeypatch.setattr(limiter, "hit", hit)
+    with pytest.raises(TranslatorCircuitOpen) as error:
+        asyncio.run(client.translate_many(["a"]))
+    assert hits == []
+    assert 0 < error.value.retry_after <= 30
@@ -0,0 +1,160 @@
+"""Bulk import of a vocabulary from another app.
+
+Accepts CSV (word,translation,pos; the header row is optional) or NDJSON
+objects with "word", "translation" and "pos" or "part_of_speech" keys, so
+the files of /user/my-words/export can be imported back. Rows without a
+translation are translated in batches before the merge.
+
+    python -m vocabulary_work.importer user@example.com words.csv
+"""
+import asyncio
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+from uuid import UUID
+
+import settings
+from api.actions.word import WordService
+from db.dals import UserDAL, WordDAL
+from db.session import async_session, ATOMIC
+
+# untranslated words looked up (cache, translation table, offline dictionary, translator) at once
+LOOKUP_CHUNK = 1000
+# rows tagged with a part of speech between two yields to the event loop
+STAGE_CHUNK = 1000
+
+ImportRow = Tuple[str, Union[str, None], Union[str, None]]
+
+
+class InvalidImportFile(ValueError):
+    """The file can not be parsed"""
+
+
+def _clean(value, lower: bool = True) -> Union[str, None]:
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return (value.lower() if lower else value) or None
+
+
+def parse_csv(data: str) -> List[ImportRow]:
+    rows = []
+    for line in csv.reader(io.StringIO(data)):
+        if not line or (not rows and line[0].strip().lower() == "word"):
+            continue
+        line = line + [None] * (3 - len(line))
+        rows.append((_clean(line[0]), _clean(line[1]), _clean(line[2], lower=False)))
+    return rows
+
+
+def parse_ndjson(data: str) -> List[ImportRow]:
+    rows = []
+    for number, line in enumerate(data.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            raise InvalidImportFile(f"Invalid json on line {number}")
+        if not isinstance(item, dict):
+            raise InvalidImportFile(f"Line {number} is not an object")
+        rows.append((
+            _clean(item.get("word")),
+            _clean(item.get("translation")),
+            _clean(item.get("pos") or item.get("part_of_speech"), lower=False),
+        ))
+    return rows
+
+
+def parse(data: str, import_format: str) -> List[ImportRow]:
+    rows = parse_ndjson(data) if import_format == "ndjson" else parse_csv(data)
+    rows = [row for row in rows if row[0]]
+    if len(rows) > settings.IMPORT_MAX_ROWS:
+        raise InvalidImportFile(f"Too many rows, max {settings.IMPORT_MAX_ROWS} per import")
+    return rows
+
+
+async def parse_upload(data: bytes, import_format: str) -> List[ImportRow]:
+    """parse() of an uploaded file in a worker thread, a big file would block the event loop for seconds.
+
+    Raises UnicodeDecodeError when the file is not utf-8.
+    """
+    return await asyncio.to_thread(lambda: parse(data.decode("utf-8-sig"), import_format))
+
+
+async def _translate_missing(words: List[str]) -> Dict[str, Tuple[Union[str, None], Union[str, None]]]:
+    """word -> (translation, pos) for the words that came without a translation.
+
+    Nothing is written here: word_base rows are created by the import transaction.
+    """
+    translations = {}
+    async with async_session() as session:
+        word_dal = WordDAL(session)
+        for start in range(0, len(words), LOOKUP_CHUNK):
+            chunk = words[start:start + LOOKUP_CHUNK]
+            async with session.begin():
+                known = await word_dal.get_word_ids(chunk)
+            translations.update(await WordService.lookup_translations(
+                {word: known.get(word) for word in chunk}, word_dal
+            ))
+    return translations
+
+
+async def import_words(user_id: UUID, rows: List[ImportRow]) -> dict:
+    """Returns counts of new and already saved bundles and the words nobody could translate"""
+    missing = list(dict.fromkeys(word for word, translation, _ in rows if not translation))
+    translations = await _translate_missing(missing) if missing else {}
+
+    staged = {}
+    untranslated = []
+    for number, (word, translation, pos) in enumerate(rows):
+        if number and number % STAGE_CHUNK == 0:
+            # tagging runs on the loop thread, it shares the pos cache with the requests
+            await asyncio.sleep(0)
+        if not translation:
+            translation, pos = translations.get(word, (None, None))
+            if not translation:
+                untranslated.append(word)
+                continue
+        if (word, translation) not in staged:
+            staged[(word, translation)] = pos or WordService.get_part_of_speech(translation)
+
+    inserted = 0
+    if staged:
+        async with async_session() as session:
+            async with session.begin():
+                await session.connection(execution_options=ATOMIC)
+                inserted = await WordDAL(session).import_user_words(
+                    user_id,
+                    [(word, translation, pos) for (word, translation), pos in staged.items()],
+                    time=datetime.utcnow(),
+                )
+    return {
+        "inserted": inserted,
+        "duplicates": len(rows) - len(untranslated) - inserted,
+        "untranslated": list(dict.fromkeys(untranslated)),
+    }
+
+
+async def _main(email: str, path: str):
+    import_format = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+    with open(path, encoding="utf-8") as file:
+        rows = parse(file.read(), import_format)
+    async with async_session() as session:
+        user = await UserDAL(session).get_user_by_email(email)
+    if user is None:
+        print("Пользователь не найден:", email)
+        sys.exit(1)
+    result = await import_words(user.user_id, rows)
+    print("inserted:", result["inserted"], "duplicates:", result["duplicates"],
+          "untranslated:", len(result["untranslated"]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m vocabulary_work.importer <email> <file.csv|file.ndjson>")
+        sys.exit(1)
+    asyncio.run(_main(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,52 @@
+"""In-process prefix index over word_base for autocomplete.
+
+A sorted list of the words: completions of a prefix are the slice between
+bisect_left(prefix) and the first word that no longer starts with it, so a
+lookup is two binary searches and never touches the database. The index is
+loaded at startup and every WordDAL path that inserts into word_base adds
+its words once the transaction commits; words inserted by other processes
+show up after their restart.
+"""
+from bisect import bisect_left, insort
+from typing import Iterable, List
+
+# sorts after every character a word can continue a prefix with
+_PREFIX_END = "\U0010ffff"
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._words: List[str] = []
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        i = bisect_left(self._words, word)
+        return i < len(self._words) and self._words[i] == word
+
+    def load(self, words: Iterable[str]):
+        self._words = sorted(set(words))
+        self.ready = True
+
+    def add(self, word: str):
+        if word and word not in self:
+            insort(self._words, word)
+
+    def add_many(self, words: Iterable[str]):
+        """Adds a batch in one pass instead of an insort per word: timsort sees
+        two sorted runs and merges them in linear time"""
+        batch = sorted({word for word in words if word and word not in self})
+        if len(batch) == 1:
+            insort(self._words, batch[0])
+        elif batch:
+            self._words = sorted(self._words + batch)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        start = bisect_left(self._words, prefix)
+        end = min(start + limit, bisect_left(self._words, prefix + _PREFIX_END, start))
+        return self._words[start:end]
+
+
+word_index = PrefixIndex()
@@ -1,29 +1,129 @@
-import requests
-
-
-# def _get_translated_text(text):
-#     url = "https://microsoft-translator-text.p.rapidapi.com/translate"
-#     api_key = "980166210cmsh67259c90ff4afe7p114dd7jsnc8259e9857d4"
-#     #api_key = "0086541c90msh512ac39bbeb60eep1f23bejsn1fddf1acc235"
-#     querystring = {"from": "en", "to[0]": "ru", "api-version": "3.0", "profanityAction": "NoAction",
-#                    "textType": "plain"}
-#     payload = [{"Text": f"{text}"}]
-#     headers = {
-#         "content-type": "application/json",
-#         "X-RapidAPI-Key": api_key,
-#         "X-RapidAPI-Host": "microsoft-translator-text.p.rapidapi.com"
-#     }
-#     try:
-#         response = requests.post(url, json=payload, headers=headers, params=querystring)
-#         if response.status_code == 200:
-#             return response.json()[0]["translations"][0]["text"]
-#         else:
-#             print("Ошибка при получении данных. Статус код: [rapid api]", response.status_code)
-#     except requests.exceptions.RequestException as error:
-#         print("Ошибка при выполненении запроса. Статус код: ", error)
-#
-
-def _get_translated_text(text):
-    return "красный"
+"""Offline en -> ru dictionary over a memory-mapped sorted index.
 
+Index layout (little endian):
+    header   8s magic, I number of entries, I reserved
+    entries  number of entries * (I key offset, H key length, H value length),
+             sorted by the utf-8 bytes of the key
+    blob     key bytes immediately followed by value bytes for every entry
 
+Opening an index only maps the file, lookups are a binary search over the
+entries table, so startup is instant and every worker shares the same pages
+through the OS page cache.
+
+Build an index from a tab separated "word<TAB>translation" file:
+
+    python -m vocabulary_work.service build en_ru.tsv en_ru.idx
+"""
+import mmap
+import struct
+import sys
+from typing import Iterable, Tuple, Union
+
+import settings
+
+MAGIC = b"FBDICT1\0"
+HEADER = struct.Struct("<8sII")
+ENTRY = struct.Struct("<IHH")
+
+
+class OfflineDictionary:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a dictionary index")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, index: int) -> Tuple[int, int, int]:
+        return ENTRY.unpack_from(self._mm, HEADER.size + index * ENTRY.size)
+
+    def lookup(self, word: str) -> Union[str, None]:
+        key = word.strip().lower().encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset, key_length, value_length = self._entry(middle)
+            current = self._mm[offset:offset + key_length]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return self._mm[offset + key_length:offset + key_length + value_length].decode()
+        return None
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def build_index(pairs: Iterable[Tuple[str, str]], path: str) -> int:
+    """Writes the index for (word, translation) pairs, the first translation of a word wins"""
+    entries = {}
+    for word, translation in pairs:
+        key = word.strip().lower().encode()
+        value = translation.strip().lower().encode()
+        if key and value and key not in entries and len(key) <= 0xFFFF and len(value) <= 0xFFFF:
+            entries[key] = value
+
+    table = bytearray()
+    blob = bytearray()
+    blob_start = HEADER.size + len(entries) * ENTRY.size
+    for key in sorted(entries):
+        value = entries[key]
+        table += ENTRY.pack(blob_start + len(blob), len(key), len(value))
+        blob += key + value
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(entries), 0))
+        file.write(table)
+        file.write(blob)
+    return len(entries)
+
+
+def read_tsv(path: str) -> Iterable[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                yield parts[0], parts[1]
+
+
+_dictionary: Union[OfflineDictionary, None] = None
+_dictionary_failed = False
+
+
+def get_offline_dictionary() -> Union[OfflineDictionary, None]:
+    """Process-wide dictionary from settings.OFFLINE_DICTIONARY_PATH, None when it is not configured"""
+    global _dictionary, _dictionary_failed
+    if _dictionary is None and settings.OFFLINE_DICTIONARY_PATH and not _dictionary_failed:
+        try:
+            _dictionary = OfflineDictionary(settings.OFFLINE_DICTIONARY_PATH)
+        except (OSError, ValueError) as error:
+            _dictionary_failed = True
+            print("Не удалось открыть офлайн словарь:", repr(error))
+    return _dictionary
+
+
+def close_offline_dictionary():
+    global _dictionary
+    if _dictionary is not None:
+        _dictionary.close()
+        _dictionary = None
+
+
+def _get_translated_text(text) -> Union[str, None]:
+    dictionary = get_offline_dictionary()
+    if dictionary is not None:
+        return dictionary.lookup(text)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("usage: python -m vocabulary_work.service build <source.tsv> <target.idx>")
+        sys.exit(1)
+    print("entries:", build_index(read_tsv(sys.argv[2]), sys.argv[3]))